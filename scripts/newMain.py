@@ -3,30 +3,164 @@ import os
 import json
 import subprocess
 import shutil
-from typing import Dict, Optional, Set, List
-
-from PyQt5.QtGui import QIcon, QColor
+import ast
+import functools
+import asyncio
+import re
+import codecs
+import bisect
+import io
+import itertools
+import queue
+import threading
+from collections import deque
+from pathlib import Path
+from typing import Callable, Deque, Dict, FrozenSet, Optional, Set, List, Tuple
+
+from PyQt5.QtGui import QIcon, QColor, QBrush, QTextCursor
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QListWidget, QPushButton,
-    QVBoxLayout, QWidget, QTextEdit, QLabel, QHBoxLayout,
+    QVBoxLayout, QWidget, QPlainTextEdit, QLabel, QHBoxLayout,
     QLineEdit, QFormLayout, QFileDialog,
     QMenu, QAction, QInputDialog, QMessageBox, QProgressBar, QListWidgetItem, QAbstractItemView
 )
-from PyQt5.QtCore import Qt, QThread, QTimer, pyqtSignal, QObject
+from PyQt5.QtCore import Qt, QThread, QTimer, QProcess, pyqtSignal, pyqtSlot, QObject, QRunnable, QThreadPool
 
 from PyQt5.QtWidgets import QGraphicsOpacityEffect, QGraphicsDropShadowEffect
 from PyQt5.QtCore import QPropertyAnimation, QEasingCurve
 
 from importlib.metadata import distributions
 from packaging.requirements import Requirement
-import ctypes
-from ctypes import wintypes
 import venv
 
+# orjson - необязательное ускорение разбора/сериализации JSON; без него работает стандартный json
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # В начале main.py
 GITHUB_REPO_URL = "https://github.com/Dillspilit/ScriptHub" # Например, "https://github.com/your_user/your_scripts_repo.git"
-SCRIPTS_ROOT_DIR = os.path.join("scripts")
+# Абсолютный путь вычисляется один раз: не зависит от последующих смен рабочей директории
+SCRIPTS_ROOT_DIR = os.path.abspath("scripts")
 print(SCRIPTS_ROOT_DIR)
+
+# Модули стандартной библиотеки: не считаются внешними зависимостями скриптов.
+# sys.stdlib_module_names есть с Python 3.10; явный список покрывает старые версии
+# и модули, удаленные из новых (asyncore, imp и т.п.). Собирается один раз при загрузке.
+_STDLIB_MODULES = frozenset(getattr(sys, 'stdlib_module_names', ())) | frozenset({
+    'abc', 'aifc', 'argparse', 'array', 'ast', 'asynchat', 'asyncio', 'asyncore', 'audioop', 'base64',
+    'binascii', 'binhex', 'bisect', 'bz2', 'cgi', 'cgitb', 'chunk', 'code', 'codeop', 'collections', 'colorsys',
+    'compileall', 'concurrent', 'configparser', 'contextlib', 'copy', 'copyreg', 'crypt', 'csv', 'ctypes',
+    'curses', 'datetime', 'difflib', 'dis', 'email', 'ensurepip', 'enum', 'errno', 'fcntl', 'fnmatch',
+    'formatter', 'ftplib', 'functools', 'getopt', 'getpass', 'glob', 'grp', 'gzip', 'hashlib', 'heapq', 'html',
+    'http', 'imaplib', 'imghdr', 'imp', 'importlib', 'inspect', 'io', 'ipaddress', 'itertools', 'json',
+    'keyword', 'linecache', 'locale', 'logging', 'lzma', 'mailbox', 'marshal', 'math', 'mimetypes', 'mmap',
+    'modulefinder', 'msilib', 'msvcrt', 'multiprocessing', 'nis', 'nntplib', 'nt', 'numbers', 'opcode',
+    'operator', 'optparse', 'os', 'ossaudiodev', 'parser', 'pathlib', 'pickle', 'pickletools', 'pipes',
+    'pkgutil', 'platform', 'poplib', 'posix', 'pprint', 'pty', 'pwd', 'py_compile', 'pyclbr', 'queue', 'quopri',
+    'random', 're', 'reprlib', 'resource', 'runpy', 'sched', 'select', 'selectors', 'shlex', 'shutil', 'signal',
+    'smtpd', 'smtplib', 'sndhdr', 'socket', 'socketserver', 'spwd', 'ssl', 'statistics', 'string', 'struct',
+    'subprocess', 'sunau', 'symbol', 'symtable', 'sys', 'syslog', 'tabnanny', 'tarfile', 'telnetlib',
+    'tempfile', 'termios', 'textwrap', 'threading', 'time', 'token', 'tokenize', 'traceback', 'tty', 'types',
+    'typing', 'unicodedata', 'urllib', 'uu', 'uuid', 'venv', 'warnings', 'wave', 'weakref', 'webbrowser',
+    'winreg', 'winsound', 'wintypes', 'wsgiref', 'xml', 'xmlrpc', 'zipapp', 'zipfile', 'zipimport', 'zlib'
+})
+
+# Быстрый построчный поиск импортов по байтам файла. Используется для очень больших скриптов
+# и как запасной вариант, если ast.parse не справился (например, синтаксис другой версии Python).
+_IMPORT_RE = re.compile(rb'(?m)^[ \t]*(?:import[ \t]+([\w.,\t ]+)|from[ \t]+([\w.]+)[ \t]+import\b)')
+_AST_MAX_SCRIPT_SIZE = 1024 * 1024  # байт
+
+# Папки, которые не копируются при синхронизации скриптов из репозитория: локальные venv и настройки
+# пользователя, служебные данные git и кэш байткода (он все равно пересоздается)
+_SYNC_EXCLUDED_DIRS = frozenset({'.venv', 'settings', '.git', '__pycache__'})
+
+# Сколько строк (блоков) хранит консоль вывода: старые строки отбрасываются, память ограничена
+MAXIMUM_BLOCK_COUNT = 5000
+# Длиннее строки обрезаются в консоли и сессионных логах (раскладка огромной строки тормозит виджет);
+# в script_log.txt строка пишется целиком
+MAX_LINE_LEN = 4096
+
+
+@functools.lru_cache(maxsize=512)
+def _parse_requirement(requirement_line: str) -> Requirement:
+    """Разбирает строку requirements.txt; одинаковые строки в разных скриптах разбираются один раз."""
+    return Requirement(requirement_line)
+
+
+def _crop_log_lines(text: str) -> Tuple[List[str], bool]:
+    """Разбивает текст лога на строки, обрезая каждую до MAX_LINE_LEN символов.
+
+    Возвращает (строки, была ли обрезана хотя бы одна строка).
+    """
+    lines = text.split("\n")
+    if len(text) <= MAX_LINE_LEN or all(len(line) <= MAX_LINE_LEN for line in lines):
+        return lines, False
+    return [line if len(line) <= MAX_LINE_LEN
+            else f"{line[:MAX_LINE_LEN]} …[+{len(line) - MAX_LINE_LEN} символов, см. script_log.txt]"
+            for line in lines], True
+
+
+def _json_loads(data: bytes):
+    """Разбирает JSON из байтов файла: через orjson, если он установлен, иначе через json."""
+    if orjson is not None:
+        # orjson не принимает UTF-8 BOM, который оставляют некоторые редакторы Windows
+        if data.startswith(b'\xef\xbb\xbf'):
+            data = data[3:]
+        return orjson.loads(data)  # orjson.JSONDecodeError - подкласс json.JSONDecodeError
+    return json.loads(data)
+
+
+def _json_validate(data: bytes):
+    """Проверяет, что байты - валидный JSON, не сохраняя разобранное дерево объектов."""
+    if orjson is not None:
+        _json_loads(data)  # результат сразу отбрасывается, объекты освобождаются одним проходом
+        return
+    # Стандартный json: каждый объект сворачивается в None сразу после разбора, поэтому
+    # вложенные словари не накапливаются в памяти до конца проверки
+    json.loads(data, object_pairs_hook=lambda pairs: None)
+
+
+def _json_dumps(obj, indent: bool = False) -> bytes:
+    """Сериализует объект в UTF-8 байты для записи в файл, открытый в режиме 'wb'."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0)
+    return json.dumps(obj, indent=4 if indent else None).encode('utf-8')
+
+
+def copy_file_fast(source_path: str, destination_path: str):
+    """Копирует файл системным вызовом без буфера в пользовательском пространстве и переносит метаданные."""
+    # На Windows копирование целиком выполняет CopyFileW; на Linux copy_file_range копирует в ядре
+    # и на btrfs/xfs может сделать reflink (copy-on-write) вместо копирования данных; на macOS
+    # shutil.copyfile сам использует fcopyfile. При любой ошибке откатываемся на shutil.copyfile.
+    if os.name == 'nt':
+        import ctypes  # нужен только на Windows - не загружается при старте на других ОС
+        copied = ctypes.windll.kernel32.CopyFileW(source_path, destination_path, False)
+    else:
+        copied = _copy_file_range(source_path, destination_path)
+    if not copied:
+        shutil.copyfile(source_path, destination_path)
+    shutil.copystat(source_path, destination_path)
+
+
+def _copy_file_range(source_path: str, destination_path: str) -> bool:
+    """Копирует файл через os.copy_file_range (Linux, Python 3.8+). False - если способ недоступен."""
+    if not hasattr(os, 'copy_file_range'):
+        return False
+    try:
+        with open(source_path, 'rb') as src, open(destination_path, 'wb') as dst:
+            remaining = os.fstat(src.fileno()).st_size
+            while remaining > 0:
+                copied = os.copy_file_range(src.fileno(), dst.fileno(), remaining)
+                if copied == 0:
+                    break
+                remaining -= copied
+            return remaining <= 0
+    except OSError:
+        return False
+
+
 # --- Потоки (остаются без изменений, так как они хорошо инкапсулированы) ---
 # В main.py (или в отдельном файле)
 
@@ -38,44 +172,31 @@ class GitHubUpdaterThread(QThread):
     def __init__(self, repo_url: str, local_path: str, action: str):
         super().__init__()
         self.repo_url = repo_url
-        self.local_path = local_path
+        # Абсолютный путь: git вызывается с -C и не зависит от текущей директории процесса
+        self.local_path = os.path.abspath(local_path)
         self.action = action  # 'clone' или 'pull'
+        # HEAD служебного клона после успешного клонирования/обновления
+        self.new_head: Optional[str] = None
 
     def run(self):
         try:
             if self.action == 'clone':
                 self.output_signal.emit(f"⚙️ Клонирую репозиторий '{self.repo_url}' в '{self.local_path}'...")
-                subprocess.run(['git', 'clone', self.repo_url, self.local_path],
-                               check=True, capture_output=True, text=True, encoding='utf-8')
+                # Нужна только последняя ревизия: без истории, других веток и тегов
+                self._run_git('clone', '--depth=1', '--single-branch', '--no-tags', self.repo_url, self.local_path)
+                self.new_head = self._rev_parse_head()
                 self.finished_signal.emit(True, "✅ Репозиторий успешно клонирован.")
             elif self.action == 'pull':
                 self.output_signal.emit(f"⚙️ Обновляю репозиторий в '{self.local_path}'...")
-                # Переходим в директорию репозитория
-                os.chdir(self.local_path)
-
-                # Попытка git reset --hard ORIG_HEAD в случае merge-конфликта
-                # Это жестко перезапишет локальные изменения, если они есть и вызывают конфликт
-                # Можно добавить более сложную логику, если нужно сохранять локальные изменения
-                try:
-                    subprocess.run(['git', 'pull'], check=True, capture_output=True, text=True, encoding='utf-8')
-                    self.finished_signal.emit(True, "✅ Репозиторий успешно обновлен.")
-                except subprocess.CalledProcessError as e:
-                    if "merge conflict" in e.stderr.lower() or "local changes" in e.stderr.lower():
-                        self.output_signal.emit(
-                            "⚠️ Обнаружены локальные изменения или конфликт слияния. Попытка сброса...")
-                        try:
-                            subprocess.run(['git', 'reset', '--hard', 'HEAD'], check=True, capture_output=True,
-                                           text=True, encoding='utf-8')
-                            self.output_signal.emit("⚙️ Локальные изменения сброшены. Повторяю pull...")
-                            subprocess.run(['git', 'pull'], check=True, capture_output=True, text=True,
-                                           encoding='utf-8')
-                            self.finished_signal.emit(True,
-                                                      "✅ Репозиторий успешно обновлен (после сброса локальных изменений).")
-                        except Exception as reset_e:
-                            self.finished_signal.emit(False,
-                                                      f"❌ Ошибка при сбросе локальных изменений или повторном pull: {reset_e}\n{reset_e.stderr}")
-                    else:
-                        self.finished_signal.emit(False, f"❌ Ошибка при обновлении репозитория: {e.stderr.strip()}")
+                # Вместо git pull (fetch + merge) забираем удаленный HEAD и жестко переключаемся на него.
+                # Локальные изменения в служебном клоне все равно не нужны, поэтому merge-конфликтов
+                # не бывает и не требуется цепочка reset + повторный pull.
+                # --depth=1 сохраняет клон поверхностным и при последующих обновлениях.
+                # -C вместо os.chdir: не меняем рабочую директорию всего процесса из потока.
+                self._run_git('-C', self.local_path, 'fetch', '--depth=1', '--no-tags', 'origin', 'HEAD')
+                self._run_git('-C', self.local_path, 'reset', '--hard', 'FETCH_HEAD')
+                self.new_head = self._rev_parse_head()
+                self.finished_signal.emit(True, "✅ Репозиторий успешно обновлен.")
             else:
                 self.finished_signal.emit(False, "❌ Неизвестное действие Git.")
         except subprocess.CalledProcessError as e:
@@ -83,6 +204,28 @@ class GitHubUpdaterThread(QThread):
         except Exception as e:
             self.finished_signal.emit(False, f"❌ Непредвиденная ошибка: {str(e)}")
 
+    def _run_git(self, *args: str) -> subprocess.CompletedProcess:
+        return subprocess.run(['git', *args], check=True, capture_output=True, text=True, encoding='utf-8')
+
+    def _rev_parse_head(self) -> str:
+        return self._run_git('-C', self.local_path, 'rev-parse', 'HEAD').stdout.strip()
+
+
+class FileCopyRunnable(QRunnable):
+    """Копирует один файл в пуле потоков. Ошибки складываются в общий список errors."""
+
+    def __init__(self, source_path: str, target_path: str, errors: List[str]):
+        super().__init__()
+        self.source_path = source_path
+        self.target_path = target_path
+        self.errors = errors
+
+    def run(self):
+        try:
+            shutil.copy2(self.source_path, self.target_path)
+        except Exception as e:
+            self.errors.append(f"{self.source_path}: {e}")
+
 
 class GitHubManager(QObject):
     # Сигналы для MainWindow
@@ -95,14 +238,16 @@ class GitHubManager(QObject):
         self.github_repo_url = github_repo_url
         self.repo_local_path = os.path.join(self.script_root_dir,
                                             ".github_scripts_repo")  # Скрытая папка для клонирования
+        # Ревизия репозитория, скрипты из которой уже скопированы в script_root_dir
+        self.sync_state_path = os.path.join(self.script_root_dir, ".sync_state.json")
         self._updater_thread: Optional[GitHubUpdaterThread] = None
+        # Пул для копирования файлов без robocopy/rsync: задачи упираются в I/O, поэтому потоков больше, чем ядер
+        self._copy_pool = QThreadPool(self)
+        self._copy_pool.setMaxThreadCount(min(32, (os.cpu_count() or 1) * 4))
 
     def _is_git_installed(self) -> bool:
-        try:
-            subprocess.run(['git', '--version'], check=True, capture_output=True, text=True)
-            return True
-        except (subprocess.CalledProcessError, FileNotFoundError):
-            return False
+        # Поиск в PATH вместо запуска git --version: без fork/exec на каждой проверке
+        return shutil.which('git') is not None
 
     def check_and_update_repository(self):
         if not self._is_git_installed():
@@ -114,28 +259,83 @@ class GitHubManager(QObject):
             self.output_signal.emit("⚠️ Процесс обновления уже запущен. Пожалуйста, подождите.")
             return
 
-        if not os.path.exists(self.repo_local_path):
-            # Репозиторий не клонирован, клонируем
-            self._updater_thread = GitHubUpdaterThread(self.github_repo_url, self.repo_local_path, 'clone')
-            self._updater_thread.output_signal.connect(self.output_signal)
-            self._updater_thread.finished_signal.connect(self.on_update_finished)
-            self._updater_thread.start()
-        else:
-            # Репозиторий уже клонирован, обновляем
-            self._updater_thread = GitHubUpdaterThread(self.github_repo_url, self.repo_local_path, 'pull')
-            self._updater_thread.output_signal.connect(self.output_signal)
-            self._updater_thread.finished_signal.connect(self.on_update_finished)
-            self._updater_thread.start()
+        # Репозиторий не клонирован - клонируем, иначе обновляем
+        action = 'pull' if os.path.exists(self.repo_local_path) else 'clone'
+        self._updater_thread = GitHubUpdaterThread(self.github_repo_url, self.repo_local_path, action)
+        self._updater_thread.output_signal.connect(self.output_signal)
+        self._updater_thread.finished_signal.connect(self.on_update_finished)
+        self._updater_thread.start()
 
     def on_update_finished(self, success: bool, message: str):
         self.output_signal.emit(message)
         if success:
+            new_head = self._updater_thread.new_head if self._updater_thread else None
+            synced_head = self._load_synced_head()
+            if new_head and new_head == synced_head:
+                # Ревизия уже синхронизирована - копировать нечего (обычный случай при запуске)
+                self.output_signal.emit("✅ Скрипты уже актуальны, синхронизация не требуется.")
+            elif new_head and synced_head and self._sync_changed_files(synced_head, new_head):
+                self._save_synced_head(new_head)
             # После успешного обновления репозитория, нужно скопировать/обновить скрипты
-            self._sync_scripts_from_repo()
+            elif self._sync_scripts_from_repo() and new_head:
+                self._save_synced_head(new_head)
         self.update_finished_signal.emit(success, message)
         self._updater_thread = None  # Очищаем ссылку на поток
 
-    def _sync_scripts_from_repo(self):
+    def _load_synced_head(self) -> Optional[str]:
+        try:
+            with open(self.sync_state_path, 'r', encoding='utf-8') as f:
+                return json.load(f).get('synced_head')
+        except (OSError, json.JSONDecodeError, AttributeError):
+            return None
+
+    def _save_synced_head(self, head: str):
+        # Пишем во временный файл и атомарно подменяем, чтобы не оставить битое состояние
+        tmp_path = self.sync_state_path + '.tmp'
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'synced_head': head}, f)
+            os.replace(tmp_path, self.sync_state_path)
+        except OSError as e:
+            self.output_signal.emit(f"⚠️ Не удалось сохранить состояние синхронизации: {e}")
+
+    def _sync_changed_files(self, old_head: str, new_head: str) -> bool:
+        """Копирует только файлы scripts/, изменившиеся между ревизиями. False - нужна полная синхронизация."""
+        try:
+            result = subprocess.run(
+                ['git', '-C', self.repo_local_path, 'diff', '--name-status', '--no-renames', '-z',
+                 old_head, new_head, '--', 'scripts/'],
+                check=True, capture_output=True
+            )
+            # Формат -z: "<статус>\0<путь>\0" для каждого файла
+            fields = result.stdout.decode('utf-8').split('\0')[:-1]
+        except (subprocess.CalledProcessError, OSError, UnicodeDecodeError):
+            # Например, старой ревизии уже нет в поверхностном клоне или путь не в UTF-8
+            return False
+
+        changes = list(zip(fields[0::2], fields[1::2]))
+        self.output_signal.emit(f"⚙️ Синхронизирую измененные файлы скриптов ({len(changes)})...")
+        try:
+            for status, repo_path in changes:
+                parts = repo_path.split('/')[1:]  # путь без префикса scripts/
+                # Те же правила, что и при полной синхронизации: только файлы внутри папок скриптов,
+                # без скрытых папок скриптов и без исключенных вложенных папок
+                if len(parts) < 2 or parts[0].startswith('.') or not _SYNC_EXCLUDED_DIRS.isdisjoint(parts[1:-1]):
+                    continue
+                target_path = os.path.join(self.script_root_dir, *parts)
+                if status == 'D':
+                    if os.path.exists(target_path):
+                        os.remove(target_path)
+                else:
+                    os.makedirs(os.path.dirname(target_path), exist_ok=True)
+                    copy_file_fast(os.path.join(self.repo_local_path, *repo_path.split('/')), target_path)
+            self.output_signal.emit("✅ Скрипты успешно синхронизированы.")
+            return True
+        except Exception as e:
+            self.output_signal.emit(f"⚠️ Ошибка частичной синхронизации ({str(e)}), выполняю полную.")
+            return False
+
+    def _sync_scripts_from_repo(self) -> bool:
         # Эта функция будет копировать скрипты из клонированного репозитория
         # в вашу рабочую папку SCRIPTS_ROOT_DIR.
         # Это предотвратит перезапись вашей папки settings и venv.
@@ -145,9 +345,12 @@ class GitHubManager(QObject):
 
         if not os.path.exists(source_scripts_path):
             self.output_signal.emit("❌ Не удалось найти папку 'scripts' в репозитории. Проверьте структуру.")
-            return
+            return False
 
         self.output_signal.emit("⚙️ Синхронизирую скрипты из репозитория...")
+        # robocopy/rsync копируют большие деревья заметно быстрее, чем обход os.walk + shutil.copy2
+        native_tool = shutil.which('robocopy' if os.name == 'nt' else 'rsync')
+        copy_errors: List[str] = []
         try:
             for item_name in os.listdir(source_scripts_path):
                 item_path = os.path.join(source_scripts_path, item_name)
@@ -158,29 +361,64 @@ class GitHubManager(QObject):
                     if item_name.startswith('.'):  # Пропускаем скрытые папки (например, .git)
                         continue
 
-                    # Если папка скрипта уже существует, копируем содержимое, исключая .venv и settings
                     if os.path.exists(target_path):
                         self.output_signal.emit(f"   Обновляю скрипт: {item_name}")
-                        for root, dirs, files in os.walk(item_path):
-                            # Исключаем папки .venv и settings при копировании
-                            dirs[:] = [d for d in dirs if d not in ['.venv', 'settings']]
-
-                            relative_path = os.path.relpath(root, item_path)
-                            dest_dir = os.path.join(target_path, relative_path)
-                            os.makedirs(dest_dir, exist_ok=True)
-                            for file in files:
-                                shutil.copy2(os.path.join(root, file), os.path.join(dest_dir, file))
                     else:
-                        # Если папки скрипта нет, копируем ее целиком
                         self.output_signal.emit(f"   Добавляю новый скрипт: {item_name}")
-                        shutil.copytree(item_path, target_path)
+
+                    # Содержимое копируется без _SYNC_EXCLUDED_DIRS, чтобы не затереть локальные данные
+                    if native_tool:
+                        self._native_copy_script_dir(native_tool, item_path, target_path)
+                    else:
+                        self._submit_tree_copy(item_path, target_path, copy_errors)
+
+            # Дожидаемся всех файловых копий из пула, прежде чем сообщать об успехе
+            self._copy_pool.waitForDone()
+            if copy_errors:
+                raise RuntimeError("не удалось скопировать файлы:\n" + "\n".join(copy_errors))
             self.output_signal.emit("✅ Скрипты успешно синхронизированы.")
             # Сигнал для MainWindow обновить список скриптов
             # В MainWindow должен быть метод, который будет вызываться после этого,
             # чтобы обновить список скриптов в UI.
             # self.script_list_updated_signal.emit() # Пример, нужно определить этот сигнал в MainWindow
+            return True
         except Exception as e:
+            self._copy_pool.waitForDone()
             self.output_signal.emit(f"❌ Ошибка синхронизации скриптов: {str(e)}")
+            return False
+
+    def _submit_tree_copy(self, source_dir: str, target_dir: str, errors: List[str]):
+        """Создает структуру папок и отправляет копирование каждого файла в пул, исключая _SYNC_EXCLUDED_DIRS."""
+        for root, dirs, files in os.walk(source_dir):
+            dirs[:] = [d for d in dirs if d not in _SYNC_EXCLUDED_DIRS]
+
+            relative_path = os.path.relpath(root, source_dir)
+            dest_dir = os.path.join(target_dir, relative_path)
+            os.makedirs(dest_dir, exist_ok=True)
+            for file in files:
+                self._copy_pool.start(FileCopyRunnable(os.path.join(root, file), os.path.join(dest_dir, file), errors))
+
+    def _native_copy_script_dir(self, tool_path: str, source_dir: str, target_dir: str):
+        """Копирует папку скрипта через robocopy (Windows) или rsync, пропуская _SYNC_EXCLUDED_DIRS."""
+        excluded_dirs = sorted(_SYNC_EXCLUDED_DIRS)
+        if os.name == 'nt':
+            result = subprocess.run(
+                [tool_path, source_dir, target_dir, '/E', '/XD', *excluded_dirs,
+                 '/NFL', '/NDL', '/NJH', '/NJS', '/MT:8'],
+                capture_output=True, text=True
+            )
+            # У robocopy коды 0-7 означают успех, 8 и выше - ошибки копирования
+            if result.returncode > 7:
+                raise RuntimeError(f"robocopy завершился с кодом {result.returncode}: {result.stdout.strip()}")
+        else:
+            result = subprocess.run(
+                # Завершающий / - исключаются только папки с этими именами, а не файлы
+                [tool_path, '-a', *(f'--exclude={d}/' for d in excluded_dirs),
+                 source_dir + os.sep, target_dir + os.sep],
+                capture_output=True, text=True
+            )
+            if result.returncode != 0:
+                raise RuntimeError(f"rsync завершился с кодом {result.returncode}: {result.stderr.strip()}")
 
     def _should_auto_update(self) -> bool:
         # Здесь будет логика чтения настройки пользователя об автообновлении
@@ -194,10 +432,9 @@ class VenvCreationThread(QThread):
     output_signal = pyqtSignal(str)
     finished_signal = pyqtSignal(bool, str)
 
-    def __init__(self, venv_path, python_path):
+    def __init__(self, venv_path):
         super().__init__()
         self.venv_path = venv_path
-        self.python_path = python_path
         self._is_running = True
 
     def run(self):
@@ -205,13 +442,6 @@ class VenvCreationThread(QThread):
             self.output_signal.emit("🔍 Начинаю создание виртуального окружения...")
             self.progress_signal.emit(10)
 
-            if not self._check_virtualenv_installed():
-                self.output_signal.emit("📦 Устанавливаю virtualenv...")
-                if not self._install_virtualenv():
-                    self.finished_signal.emit(False, "Не удалось установить virtualenv")
-                    return
-                self.progress_signal.emit(30)
-
             self.output_signal.emit("⚙️ Создаю виртуальное окружение...")
             if not self._create_virtualenv():
                 self.finished_signal.emit(False, "Ошибка создания виртуального окружения")
@@ -231,42 +461,20 @@ class VenvCreationThread(QThread):
         except Exception as e:
             self.finished_signal.emit(False, str(e))
 
-    def _check_virtualenv_installed(self) -> bool:
+    def _create_virtualenv(self) -> bool:
+        # Стандартный venv создает окружение прямо в этом процессе - без отдельного
+        # интерпретатора и без установки virtualenv. Отдельным процессом запускается только ensurepip.
         try:
-            subprocess.run(
-                [self.python_path, "-m", "virtualenv", "--version"],
-                check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE
-            )
+            venv.EnvBuilder(with_pip=True, symlinks=os.name != "nt").create(self.venv_path)
             return True
-        except subprocess.CalledProcessError:
+        except Exception as e:
+            self.output_signal.emit(f"⚠️ {str(e)}")
             return False
 
-    def _install_virtualenv(self) -> bool:
-        result = subprocess.run(
-            [self.python_path, "-m", "pip", "install", "virtualenv"],
-            capture_output=True, text=True
-        )
-        if result.stdout:
-            self.output_signal.emit(result.stdout.strip())
-        if result.stderr:
-            self.output_signal.emit(f"⚠️ {result.stderr.strip()}")
-        return result.returncode == 0
-
-    def _create_virtualenv(self) -> bool:
-        result = subprocess.run(
-            [self.python_path, "-m", "virtualenv", self.venv_path],
-            capture_output=True, text=True
-        )
-        if result.stdout:
-            self.output_signal.emit(result.stdout.strip())
-        if result.stderr:
-            self.output_signal.emit(f"⚠️ {result.stderr.strip()}")
-        return result.returncode == 0
-
     def _check_pip_installed(self, python_exec: str) -> bool:
         result = subprocess.run(
             [python_exec, "-m", "pip", "--version"],
-            capture_output=True, text=True
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
         )
         return result.returncode == 0
 
@@ -276,15 +484,25 @@ class VenvCreationThread(QThread):
 
 class InstallThread(QThread):
     progress_signal = pyqtSignal(int)
-    output_signal = pyqtSignal(str)
+    output_signal = pyqtSignal(str)  # может содержать несколько строк, разделенных \n
     finished_signal = pyqtSignal(bool)
 
+    # Вывод pip отправляется пачками, а не сигналом на каждую строку
+    OUTPUT_BATCH_LINES = 32
+    OUTPUT_FLUSH_INTERVAL = 0.05  # секунды
+    # Предел длины одной строки вывода pip (по умолчанию у asyncio 64 КБ - мало для логов сборки)
+    STREAM_LINE_LIMIT = 1024 * 1024
+
     def __init__(self, python_exec: str, requirements_path: str):
         super().__init__()
         self.python_exec = python_exec
         self.requirements_path = requirements_path
         self._is_running = True
-        self.process = None
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._output_buffer: List[str] = []
+        self._progress = 0
+        self._emitted_progress = 0
 
     def run(self):
         try:
@@ -294,29 +512,12 @@ class InstallThread(QThread):
 
             self.output_signal.emit("📦 Устанавливаю пакеты из requirements.txt...")
 
-            self.process = subprocess.Popen(
-                [self.python_exec, "-m", "pip", "install", "-r", self.requirements_path],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                bufsize=1,
-                universal_newlines=True,
-            )
-
-            progress = 0
-            for line in self._read_lines(self.process.stdout):
-                if not self._is_running:
-                    self.output_signal.emit("❌ Установка прервана пользователем")
-                    self.process.kill()
-                    self.finished_signal.emit(False)
-                    return
-                self.output_signal.emit(line.strip())
-                progress = min(progress + 3, 95)
-                self.progress_signal.emit(progress)
-
-            for line in self._read_lines(self.process.stderr):
-                self.output_signal.emit(f"⚠️ {line.strip()}")
+            return_code = asyncio.run(self._install_requirements())
+            if not self._is_running:
+                self.output_signal.emit("❌ Установка прервана пользователем")
+                self.finished_signal.emit(False)
+                return
 
-            return_code = self.process.wait()
             if return_code == 0:
                 self.progress_signal.emit(100)
                 self.output_signal.emit("✅ Зависимости успешно установлены!")
@@ -329,12 +530,77 @@ class InstallThread(QThread):
             self.output_signal.emit(f"❌ Критическая ошибка при установке: {str(e)}")
             self.finished_signal.emit(False)
 
-    def _read_lines(self, pipe):
+    async def _install_requirements(self) -> int:
+        self._loop = asyncio.get_running_loop()
+        # -u: pip пишет без буферизации, строки приходят сразу, а не блоками по 4 КБ.
+        # Каналы двоичные, декодирование делаем сами в _pump_lines.
+        self.process = await asyncio.create_subprocess_exec(
+            self.python_exec, "-u", "-m", "pip", "install", "-r", self.requirements_path,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            close_fds=True,
+            start_new_session=True,
+            limit=self.STREAM_LINE_LIMIT,
+        )
+        if not self._is_running:  # stop() пришел до запуска процесса
+            self._kill_process()
+        flusher = asyncio.ensure_future(self._flush_output_periodically())
         try:
-            for line in iter(pipe.readline, ''):
-                yield line
+            # stdout и stderr читаются одновременно: pip не блокируется на переполненном буфере stderr,
+            # пока мы ждем конца stdout
+            await asyncio.gather(
+                self._pump_lines(self.process.stdout, self._on_stdout_line),
+                self._pump_lines(self.process.stderr, lambda line: self._queue_output(f"⚠️ {line}")),
+            )
+            return await self.process.wait()
         finally:
-            pipe.close()
+            flusher.cancel()
+            self._flush_output()
+            # При ошибке чтения pip не должен остаться работать без нас
+            if self.process.returncode is None:
+                self._kill_process()
+                await self.process.wait()
+
+    async def _pump_lines(self, stream: asyncio.StreamReader, on_line):
+        while True:
+            try:
+                line = await stream.readline()
+            except ValueError:
+                # Строка длиннее STREAM_LINE_LIMIT: readline уже отбросил ее из буфера, читаем дальше
+                on_line("… (слишком длинная строка вывода пропущена)")
+                continue
+            if not line:
+                break
+            on_line(line.decode('utf-8', 'replace').strip())
+
+    def _on_stdout_line(self, line: str):
+        self._progress = min(self._progress + 3, 95)
+        self._queue_output(line)
+
+    def _queue_output(self, line: str):
+        self._output_buffer.append(line)
+        if len(self._output_buffer) >= self.OUTPUT_BATCH_LINES:
+            self._flush_output()
+
+    async def _flush_output_periodically(self):
+        while True:
+            await asyncio.sleep(self.OUTPUT_FLUSH_INTERVAL)
+            self._flush_output()
+
+    def _flush_output(self):
+        if self._output_buffer:
+            self.output_signal.emit("\n".join(self._output_buffer))
+            self._output_buffer = []
+        if self._progress != self._emitted_progress:
+            self._emitted_progress = self._progress
+            self.progress_signal.emit(self._progress)
+
+    def _kill_process(self):
+        if self.process and self.process.returncode is None:
+            try:
+                self.process.kill()
+            except ProcessLookupError:
+                pass
 
     def _run_command(self, cmd: List[str]) -> bool:
         process = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
@@ -346,8 +612,12 @@ class InstallThread(QThread):
 
     def stop(self):
         self._is_running = False
-        if self.process and self.process.poll() is None:
-            self.process.kill()
+        # Процесс принадлежит event loop потока установки, поэтому убиваем его через этот loop
+        if self._loop and not self._loop.is_closed():
+            try:
+                self._loop.call_soon_threadsafe(self._kill_process)
+            except RuntimeError:
+                pass  # loop успел закрыться - установка уже завершена
 
 
 class ScriptOperations(QObject):  # Наследуем от QObject, если будут сигналы/слоты
@@ -365,7 +635,7 @@ class ScriptOperations(QObject):  # Наследуем от QObject, если б
     def add_script_file(self, source_path: str) -> Optional[str]:
         filename = os.path.basename(source_path)
         name_no_ext = os.path.splitext(filename)[0]
-        script_dir = os.path.join("scripts", name_no_ext)
+        script_dir = os.path.join(SCRIPTS_ROOT_DIR, name_no_ext)
         script_path = os.path.join(script_dir, "script.py")
 
         if os.path.exists(script_dir):
@@ -373,12 +643,12 @@ class ScriptOperations(QObject):  # Наследуем от QObject, если б
             return None
 
         os.makedirs(script_dir, exist_ok=True)
-        shutil.copy(source_path, script_path)
+        copy_file_fast(source_path, script_path)
         self.log_output_signal.emit(f"✅ Скрипт {filename} успешно добавлен!")
         return name_no_ext
 
     def delete_script_folder(self, script_name: str) -> bool:
-        script_dir = os.path.join("scripts", script_name)
+        script_dir = os.path.join(SCRIPTS_ROOT_DIR, script_name)
         if os.path.exists(script_dir):
             shutil.rmtree(script_dir)
             self.log_output_signal.emit(f"🗑️ Скрипт {script_name} успешно удален.")
@@ -387,8 +657,8 @@ class ScriptOperations(QObject):  # Наследуем от QObject, если б
         return False
 
     def rename_script_folder(self, old_name: str, new_name: str) -> bool:
-        old_script_dir = os.path.join("scripts", old_name)
-        new_script_dir = os.path.join("scripts", new_name)
+        old_script_dir = os.path.join(SCRIPTS_ROOT_DIR, old_name)
+        new_script_dir = os.path.join(SCRIPTS_ROOT_DIR, new_name)
 
         if os.path.exists(new_script_dir):
             self.log_output_signal.emit(f"⚠️ Скрипт с именем '{new_name}' уже существует.")
@@ -403,12 +673,12 @@ class ScriptOperations(QObject):  # Наследуем от QObject, если б
         return True
 
     def get_script_path(self, script_name: str) -> Optional[str]:
-        script_dir = os.path.join("scripts", script_name)
+        script_dir = os.path.join(SCRIPTS_ROOT_DIR, script_name)
         script_path = os.path.join(script_dir, "script.py")
         return script_path if os.path.exists(script_path) else None
 
     def get_script_dir(self, script_name: str) -> str:
-        return os.path.join("scripts", script_name)
+        return os.path.join(SCRIPTS_ROOT_DIR, script_name)
 
 
 class DependencyManagement(QObject):  # Наследуем от QObject
@@ -421,99 +691,129 @@ class DependencyManagement(QObject):  # Наследуем от QObject
 
     def __init__(self):
         super().__init__()
-        self._installed_packages_cache: Optional[Dict[str, str]] = None
+        # (сигнатура каталогов sys.path, {имя пакета: версия})
+        self._installed_packages_cache: Optional[Tuple[tuple, Dict[str, str]]] = None
+        # папка скрипта -> (ключ состояния файлов, результат проверки, сообщения проверки)
+        self._deps_check_cache: Dict[str, Tuple[tuple, bool, List[str]]] = {}
         self._install_thread: Optional[InstallThread] = None
         self._venv_thread: Optional[VenvCreationThread] = None
 
-    def _get_stdlib_list(self) -> Set[str]:
-        return {
-            'os', 'sys', 'json', 'time', 'datetime', 're', 'math', 'random',
-            'subprocess', 'shutil', 'ctypes', 'wintypes', 'collections',
-            'logging', 'threading', 'multiprocessing', 'queue', 'urllib',
-            'ssl', 'socket', 'hashlib', 'itertools', 'functools', 'operator',
-            'pathlib', 'tempfile', 'pickle', 'copy', 'weakref', 'enum',
-            'numbers', 'statistics', 'typing', 'struct', 'binascii',
-            'heapq', 'bisect', 'array', 'sched', 'locale', 'unicodedata',
-            'string', 'textwrap', 'difflib', 'csv', 'configparser', 'glob',
-            'fnmatch', 'linecache', 'shlex', 'zipfile', 'tarfile', 'zlib',
-            'gzip', 'bz2', 'lzma', 'zipimport', 'importlib', 'pkgutil',
-            'modulefinder', 'runpy', 'traceback', 'inspect', 'ast', 'symtable',
-            'tokenize', 'keyword', 'token', 'opcode', 'dis', 'pickletools',
-            'code', 'codeop', 'pprint', 'reprlib', 'weakref', 'abc', 'collections',
-            'contextlib', 'functools', 'itertools', 'operator', 'types', 'typing',
-            'copyreg', 'marshal', 'warnings', 'errno', 'io', 'selectors',
-            'threading', 'multiprocessing', 'concurrent', 'asyncio', 'socket',
-            'ssl', 'signal', 'mmap', 'fcntl', 'pwd', 'grp', 'posix', 'nt',
-            'spwd', 'crypt', 'termios', 'tty', 'pty', 'resource', 'syslog',
-            'pipes', 'select', 'asyncore', 'asynchat', 'email', 'json', 'mailbox',
-            'mimetypes', 'base64', 'binhex', 'binascii', 'quopri', 'uu',
-            'html', 'xml', 'webbrowser', 'cgi', 'cgitb', 'wsgiref', 'urllib',
-            'ftplib', 'poplib', 'imaplib', 'nntplib', 'smtplib', 'smtpd',
-            'telnetlib', 'uuid', 'socketserver', 'http', 'http.server',
-            'http.client', 'ftplib', 'poplib', 'imaplib', 'nntplib',
-            'smtplib', 'smtpd', 'telnetlib', 'xmlrpc', 'ipaddress',
-            'audioop', 'aifc', 'sunau', 'wave', 'chunk', 'colorsys',
-            'imghdr', 'sndhdr', 'ossaudiodev', 'getopt', 'argparse',
-            'getpass', 'curses', 'platform', 'errno', 'ctypes', 'threading',
-            'zipimport', 'pkgutil', 'modulefinder', 'runpy', 'importlib',
-            'imp', 'parser', 'ast', 'symtable', 'symbol', 'token', 'keyword',
-            'tokenize', 'tabnanny', 'pyclbr', 'py_compile', 'compileall',
-            'dis', 'pickletools', 'formatter', 'msilib', 'msvcrt', 'winreg',
-            'winsound', 'posix', 'pwd', 'spwd', 'grp', 'crypt', 'termios',
-            'tty', 'pty', 'fcntl', 'pipes', 'resource', 'nis', 'syslog',
-            'optparse', 'imp', 'importlib', 'ensurepip', 'venv', 'zipapp'
-        }
+    def _get_stdlib_list(self) -> FrozenSet[str]:
+        return _STDLIB_MODULES
 
     def analyze_imports(self, script_path: str) -> Optional[List[str]]:
         try:
-            with open(script_path, 'r', encoding='utf-8') as f:
+            with open(script_path, 'rb') as f:
                 content = f.read()
 
-            stdlib = self._get_stdlib_list()
-            imports = set()
-            lines = [line.strip() for line in content.split('\n')
-                     if line.strip() and not line.strip().startswith('#')]
-
-            for line in lines:
-                if line.startswith('import '):
-                    modules = [m.strip().split('.')[0].split(' as ')[0]
-                               for m in line[7:].split(',')]
-                    imports.update(m for m in modules if m and m not in stdlib)
-                elif line.startswith('from '):
-                    parts = line.split()
-                    if len(parts) >= 4 and parts[2] == 'import':
-                        module = parts[1].split('.')[0]
-                        if module not in stdlib:
-                            imports.add(module)
+            if len(content) > _AST_MAX_SCRIPT_SIZE:
+                imports = self._scan_imports_regex(content)
+            else:
+                try:
+                    imports = self._scan_imports_ast(content, script_path)
+                except SyntaxError as e:
+                    self.log_output_signal.emit(f"⚠️ Не удалось разобрать скрипт ({e}), ищу импорты построчно.")
+                    imports = self._scan_imports_regex(content)
+            imports -= self._get_stdlib_list()
             return sorted(imports) if imports else None
         except Exception as e:
             self.log_output_signal.emit(f"⚠️ Ошибка анализа скрипта: {str(e)}")
             return None
 
+    def _scan_imports_ast(self, content: bytes, script_path: str) -> Set[str]:
+        imports = set()
+        # Один проход по AST учитывает многострочные, вложенные и относительные импорты
+        for node in ast.walk(ast.parse(content, filename=script_path)):
+            if isinstance(node, ast.Import):
+                imports.update(alias.name.split('.')[0] for alias in node.names)
+            elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+                imports.add(node.module.split('.')[0])
+        return imports
+
+    def _scan_imports_regex(self, content: bytes) -> Set[str]:
+        imports = set()
+        # Декодируются только короткие совпадения, а не весь файл
+        for match in _IMPORT_RE.finditer(content):
+            if match.group(1):
+                modules = [part.split()[0] for part in match.group(1).split(b',') if part.strip()]
+            else:
+                modules = [match.group(2)]
+            for module in modules:
+                name = module.split(b'.')[0]
+                if name:  # пустое имя - относительный импорт (from . import x)
+                    imports.add(name.decode('utf-8', 'replace'))
+        return imports
+
     def create_requirements_file(self, script_dir: str, imports: List[str]):
         requirements_path = os.path.join(script_dir, "requirements.txt")
-        with open(requirements_path, 'w', encoding='utf-8') as f:  # Added encoding here
-            f.write("\n".join(imports) + "\n")
+        # Одна запись байтов через дескриптор, без слоя TextIOWrapper.
+        # O_BINARY (только Windows) отключает перевод \n в \r\n.
+        data = ("\n".join(imports) + "\n").encode('utf-8')
+        fd = os.open(requirements_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_BINARY', 0), 0o644)
+        try:
+            os.write(fd, data)
+        finally:
+            os.close(fd)
         self.log_output_signal.emit(f"✅ Создан requirements.txt для {os.path.basename(script_dir)}")
 
+    def _dependency_check_key(self, script_dir: str, requirements_path: str) -> tuple:
+        # Результат проверки меняется только вместе с requirements.txt, venv скрипта или набором пакетов
+        mtimes = []
+        for path in (requirements_path, os.path.join(script_dir, ".venv", "pyvenv.cfg")):
+            try:
+                mtimes.append(os.stat(path).st_mtime_ns)
+            except OSError:
+                mtimes.append(None)
+        return tuple(mtimes), self._packages_signature()
+
+    def invalidate_dependency_check(self, script_dir: Optional[str] = None):
+        """Сбрасывает кэш проверки зависимостей для одной папки скрипта или для всех."""
+        if script_dir is None:
+            self._deps_check_cache.clear()
+        else:
+            self._deps_check_cache.pop(script_dir, None)
+
     def check_dependencies(self, script_dir: str) -> bool:
         requirements_path = os.path.join(script_dir, "requirements.txt")
+        key = self._dependency_check_key(script_dir, requirements_path)
+        cached = self._deps_check_cache.get(script_dir)
+        if cached is not None and cached[0] == key:
+            # Повторный выбор того же скрипта: те же сообщения без повторного разбора requirements.txt
+            for message in cached[2]:
+                self.log_output_signal.emit(message)
+            return cached[1]
+
+        messages: List[str] = []
+        try:
+            result = self._check_requirements(requirements_path, messages.append)
+        except Exception as e:
+            for message in messages:
+                self.log_output_signal.emit(message)
+            self.log_output_signal.emit(f"❌ Ошибка проверки зависимостей: {str(e)}")
+            return False
+        for message in messages:
+            self.log_output_signal.emit(message)
+        self._deps_check_cache[script_dir] = (key, result, messages)
+        return result
+
+    def _check_requirements(self, requirements_path: str, log: Callable[[str], None]) -> bool:
         if not os.path.exists(requirements_path):
-            self.log_output_signal.emit("ℹ️ requirements.txt не найден, зависимости не требуются.")
+            log("ℹ️ requirements.txt не найден, зависимости не требуются.")
             return True
 
-        try:
-            # self.log_output_signal.emit("🔍 Проверяю зависимости...")
-            missing = []
-            installed = self.get_installed_packages()
-
-            with open(requirements_path, 'r', encoding='utf-8') as f:
-                requirements = [line.strip() for line in f
-                                if line.strip() and not line.strip().startswith('#')]
+        # log("🔍 Проверяю зависимости...")
+        missing = []
+        installed = self.get_installed_packages()
 
-            for req_str in requirements:
+        with open(requirements_path, 'rb') as f:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith(b'#'):
+                    continue
+                # Декодируем только значимые строки
+                req_str = line.decode('utf-8')
                 try:
-                    req = Requirement(req_str)
+                    req = _parse_requirement(req_str)
                     pkg_name = req.name.lower()
 
                     if pkg_name not in installed:
@@ -521,18 +821,14 @@ class DependencyManagement(QObject):  # Наследуем от QObject
                     elif req.specifier and not req.specifier.contains(installed[pkg_name]):
                         missing.append(f"{pkg_name} (требуется {req.specifier}, установлено {installed[pkg_name]})")
                 except Exception as e:
-                    self.log_output_signal.emit(f"⚠️ Ошибка разбора строки '{req_str}': {e}")
+                    log(f"⚠️ Ошибка разбора строки '{req_str}': {e}")
                     continue
 
-            if missing:
-                msg = "⚠️ Обнаружены проблемы с зависимостями:\n" + "\n".join(missing)
-                self.log_output_signal.emit(msg)
-                return False
-            self.log_output_signal.emit("✅ Все зависимости удовлетворяют требованиям.")
-            return True
-        except Exception as e:
-            self.log_output_signal.emit(f"❌ Ошибка проверки зависимостей: {str(e)}")
+        if missing:
+            log("⚠️ Обнаружены проблемы с зависимостями:\n" + "\n".join(missing))
             return False
+        log("✅ Все зависимости удовлетворяют требованиям.")
+        return True
 
     def _on_venv_creation_finished(self, script_dir: str, success: bool, result: str):
         if success:
@@ -560,7 +856,7 @@ class DependencyManagement(QObject):  # Наследуем от QObject
             return None
 
         self.log_output_signal.emit("⚙️ Создаю виртуальное окружение...")
-        self._venv_thread = VenvCreationThread(venv_dir, sys.executable)
+        self._venv_thread = VenvCreationThread(venv_dir)
         self._venv_thread.output_signal.connect(self.log_output_signal.emit)
         self._venv_thread.progress_signal.connect(self.progress_signal.emit)
         self._venv_thread.finished_signal.connect(
@@ -602,15 +898,28 @@ class DependencyManagement(QObject):  # Наследуем от QObject
         self.progress_signal.emit(0)
         self.dependencies_installed_signal.emit(script_dir, success)  # Отправляем сигнал
 
+    def _packages_signature(self) -> tuple:
+        # Установка/удаление пакета меняет mtime каталога site-packages, в который он ставится
+        signature = []
+        for path in sys.path:
+            try:
+                signature.append((path, os.stat(path).st_mtime_ns))
+            except OSError:
+                continue
+        return tuple(signature)
+
     def get_installed_packages(self) -> Dict[str, str]:
-        if self._installed_packages_cache is None:
-            self._installed_packages_cache = {
+        signature = self._packages_signature()
+        if self._installed_packages_cache is None or self._installed_packages_cache[0] != signature:
+            packages = {
                 dist.metadata["Name"].lower(): dist.version
                 for dist in distributions()
             }
-        return self._installed_packages_cache
+            self._installed_packages_cache = (signature, packages)
+        return self._installed_packages_cache[1]
 
     def clear_packages_cache(self):
+        # Принудительный пересбор при следующем обращении, даже если mtime каталогов не изменился
         self._installed_packages_cache = None
 
 
@@ -622,15 +931,16 @@ class SettingsManager(QObject):  # Наследуем от QObject
         super().__init__()
 
     def get_settings_path(self, script_name: str) -> str:
-        script_dir = os.path.join("scripts", script_name)
+        script_dir = os.path.join(SCRIPTS_ROOT_DIR, script_name)
         return os.path.join(script_dir, "settings.json")
 
     def load_settings(self, settings_path: str) -> Optional[Dict[str, str]]:
         if not os.path.exists(settings_path):
             return None
         try:
-            with open(settings_path, "r", encoding='utf-8') as f:
-                return json.load(f)
+            # Одно чтение байтов без текстового слоя
+            with open(settings_path, "rb") as f:
+                return _json_loads(f.read())
         except Exception as e:
             self.log_output_signal.emit(f"❌ Ошибка загрузки настроек из {os.path.basename(settings_path)}: {str(e)}")
             return None
@@ -638,18 +948,22 @@ class SettingsManager(QObject):  # Наследуем от QObject
     def save_settings(self, settings_path: str, data: Dict[str, str]):
         try:
             os.makedirs(os.path.dirname(settings_path), exist_ok=True)
-            with open(settings_path, "w", encoding='utf-8') as f:
-                json.dump(data, f, indent=4)
+            # Один вызов write во временный файл и атомарная подмена: сбой посреди записи
+            # не оставит обрезанный settings.json
+            tmp_path = settings_path + '.tmp'
+            with open(tmp_path, "wb") as f:
+                f.write(_json_dumps(data, indent=True))
+            os.replace(tmp_path, settings_path)
             self.log_output_signal.emit(f"✅ Настройки сохранены в {os.path.basename(settings_path)}")
         except Exception as e:
             self.log_output_signal.emit(f"❌ Ошибка сохранения настроек в {os.path.basename(settings_path)}: {str(e)}")
 
     def copy_settings_file(self, source_path: str, destination_path: str) -> bool:
         try:
-            with open(source_path, "r", encoding='utf-8') as f:  # Added encoding here
-                json.load(f)
+            with open(source_path, "rb") as f:
+                _json_validate(f.read())
             os.makedirs(os.path.dirname(destination_path), exist_ok=True)
-            shutil.copy(source_path, destination_path)
+            copy_file_fast(source_path, destination_path)
             self.log_output_signal.emit(f"✅ Файл настроек {os.path.basename(source_path)} успешно скопирован.")
             return True
         except json.JSONDecodeError:
@@ -667,64 +981,154 @@ class ScriptListManager(QObject):  # Наследуем от QObject
 
     def __init__(self):
         super().__init__()
-        self.pinned_scripts = set()
-        self.load_pinned_scripts()
+        # pinned_scripts.json читается при первом обращении к pinned_scripts, а не при создании объекта
+        self._pinned_scripts: Optional[Set[str]] = None
+        # (mtime_ns папки scripts, множество найденных скриптов, отсортированные незакрепленные)
+        self._scan_cache: Optional[Tuple[int, Set[str], List[str]]] = None
+        # Готовый упорядоченный список; действителен, пока действителен _scan_cache
+        self._scripts_cache: Optional[List[str]] = None
+        # Есть ли у скрипта settings.json - заполняется тем же проходом scandir, что и список скриптов
+        self._settings_exists: Dict[str, bool] = {}
+
+    @property
+    def pinned_scripts(self) -> Set[str]:
+        if self._pinned_scripts is None:
+            self.load_pinned_scripts()
+        return self._pinned_scripts
+
+    def invalidate_scripts_cache(self):
+        self._scan_cache = None
+        self._scripts_cache = None
+        self._settings_exists = {}
+
+    def has_settings_file(self, script_name: str) -> Optional[bool]:
+        """Наличие settings.json по данным последнего сканирования; None - если скрипт не сканировался."""
+        return self._settings_exists.get(script_name)
+
+    def mark_settings_file(self, script_name: str):
+        if script_name in self._settings_exists:
+            self._settings_exists[script_name] = True
 
     def load_pinned_scripts(self):
         try:
-            with open('pinned_scripts.json', 'r', encoding='utf-8') as f:
-                self.pinned_scripts = set(json.load(f))
+            with open('pinned_scripts.json', 'rb') as f:
+                names = _json_loads(f.read())
+            # Файл мог быть отредактирован вручную: не-строки (и документ не-список) пропускаются
+            if not isinstance(names, list):
+                names = []
+            # Имена интернируются: те же объекты строк, что и в get_all_scripts, поэтому проверки
+            # принадлежности множеству сравнивают указатели, а не содержимое строк
+            self._pinned_scripts = {sys.intern(name) for name in names if isinstance(name, str)}
         except (FileNotFoundError, json.JSONDecodeError):
-            self.pinned_scripts = set()
+            self._pinned_scripts = set()
             self.log_output_signal.emit("ℹ️ Файл закрепленных скриптов не найден или пуст.")
+        self.invalidate_scripts_cache()
 
     def save_pinned_scripts(self):
+        self.invalidate_scripts_cache()
+        self._write_pinned_scripts()
+
+    def _write_pinned_scripts(self):
         try:
-            with open('pinned_scripts.json', 'w', encoding='utf-8') as f:
-                json.dump(list(self.pinned_scripts), f)
+            with open('pinned_scripts.json', 'wb') as f:
+                f.write(_json_dumps(list(self.pinned_scripts)))
         except Exception as e:
             self.log_output_signal.emit(f"❌ Ошибка сохранения закрепленных скриптов: {e}")
 
     def get_all_scripts(self) -> List[str]:
-        script_dir = os.path.join(os.getcwd(), "scripts")
+        script_dir = SCRIPTS_ROOT_DIR
         os.makedirs(script_dir, exist_ok=True)
+        # Первое чтение pinned_scripts.json сбрасывает кэши - это должно случиться до сканирования,
+        # иначе вместе с ними пропадут только что собранные данные о settings.json
+        pinned = self.pinned_scripts
+
+        # Добавление, удаление и переименование папок скриптов меняет mtime папки scripts.
+        # Смена закреплений/порядка сбрасывает кэш явно.
+        mtime_ns = os.stat(script_dir).st_mtime_ns
+        if self._scan_cache is None or self._scan_cache[0] != mtime_ns:
+            all_scripts = []
+            settings_exists = {}
+            # scandir отдает тип записи вместе с листингом: is_dir() обходится без отдельного stat
+            with os.scandir(script_dir) as entries:
+                for entry in entries:
+                    if not entry.is_dir():
+                        continue
+                    has_script, has_settings = self._scan_script_folder(entry.path)
+                    if has_script:
+                        name = sys.intern(entry.name)
+                        all_scripts.append(name)
+                        settings_exists[name] = has_settings
+            self._settings_exists = settings_exists
+
+            # Проверки принадлежности - по множествам, без линейных проходов по списку
+            all_set = set(all_scripts)
+            self._scan_cache = (mtime_ns, all_set, sorted(all_set - pinned))
+            self._scripts_cache = None
+        elif self._scripts_cache is not None:
+            return self._scripts_cache
+
+        _, all_set, sorted_unpinned = self._scan_cache
+        pinned_ordered = [script for script in self.get_saved_script_order()
+                          if script in pinned and script in all_set]
+
+        result = pinned_ordered + sorted_unpinned
+        self._scripts_cache = result
+        return result
+
+    def _update_sorted_unpinned(self, script_name: str, pinned: bool):
+        # Отсортированный список незакрепленных правится точечно через bisect - без пересортировки
+        if self._scan_cache is None or script_name not in self._scan_cache[1]:
+            return
+        sorted_unpinned = self._scan_cache[2]
+        index = bisect.bisect_left(sorted_unpinned, script_name)
+        present = index < len(sorted_unpinned) and sorted_unpinned[index] == script_name
+        if pinned and present:
+            del sorted_unpinned[index]
+        elif not pinned and not present:
+            sorted_unpinned.insert(index, sys.intern(script_name))
 
-        all_scripts = []
-        for folder in os.listdir(script_dir):
-            folder_path = os.path.join(script_dir, folder)
-            script_file = os.path.join(folder_path, "script.py")
-            if os.path.isdir(folder_path) and os.path.isfile(script_file):
-                all_scripts.append(folder)
-
-        pinned_ordered = []
-        for script in self.get_saved_script_order():
-            if script in self.pinned_scripts and script in all_scripts:
-                pinned_ordered.append(script)
-
-        other_scripts = sorted([s for s in all_scripts if s not in self.pinned_scripts])
-
-        return pinned_ordered + other_scripts
+    @staticmethod
+    def _scan_script_folder(folder_path: str) -> Tuple[bool, bool]:
+        """Возвращает (есть script.py, есть settings.json) по одному листингу папки скрипта."""
+        # Тип записи приходит вместе с именем (d_type на Linux, данные FindFirstFileW на Windows),
+        # отдельный stat не нужен
+        has_script = has_settings = False
+        try:
+            with os.scandir(folder_path) as children:
+                for child in children:
+                    if child.name == "script.py":
+                        has_script = child.is_file()
+                    elif child.name == "settings.json":
+                        has_settings = child.is_file()
+        except OSError:
+            return False, False
+        return has_script, has_settings
 
     def toggle_pin_script(self, script_name: str):
         if script_name in self.pinned_scripts:
             self.pinned_scripts.remove(script_name)
+            self._update_sorted_unpinned(script_name, pinned=False)
             self.log_output_signal.emit(f"📌 Скрипт '{script_name}' откреплен.")
         else:
-            self.pinned_scripts.add(script_name)
+            self.pinned_scripts.add(sys.intern(script_name))
+            self._update_sorted_unpinned(script_name, pinned=True)
             self.log_output_signal.emit(f"📌 Скрипт '{script_name}' закреплен.")
-        self.save_pinned_scripts()
+        # Результат сканирования папки остается действительным - пересобирается только итоговый порядок
+        self._scripts_cache = None
+        self._write_pinned_scripts()
 
     def save_scripts_order(self, script_order: List[str]):
+        self._scripts_cache = None  # порядок не влияет на результат сканирования папки
         try:
-            with open('scripts_order.json', 'w', encoding='utf-8') as f:
-                json.dump(script_order, f)
+            with open('scripts_order.json', 'wb') as f:
+                f.write(_json_dumps(script_order))
         except Exception as e:
             self.log_output_signal.emit(f"❌ Ошибка сохранения порядка скриптов: {e}")
 
     def get_saved_script_order(self) -> List[str]:
         try:
-            with open('scripts_order.json', 'r', encoding='utf-8') as f:
-                return json.load(f)
+            with open('scripts_order.json', 'rb') as f:
+                return _json_loads(f.read())
         except (FileNotFoundError, json.JSONDecodeError):
             return []
 
@@ -736,95 +1140,213 @@ class ScriptExecutor(QObject):  # Наследуем от QObject
     output_signal = pyqtSignal(str)
     error_signal = pyqtSignal(str)
 
+    OUTPUT_BATCH_LINES = 64  # строк в одном сигнале output_signal
+
     def __init__(self):  # log_output_callback больше не нужен
         super().__init__()
-        self.worker_thread: Optional[WorkerThread] = None
+        # QProcess работает в цикле событий GUI: вывод приходит сигналами readyRead*, отдельный поток не нужен
+        self.process: Optional[QProcess] = None
+        self._script_name: Optional[str] = None
+        self._stdout_decoder = None
+        # Куски незавершенной строки stdout: склеиваются один раз, когда придет перевод строки
+        self._stdout_pending: List[str] = []
+        self._stderr_chunks: List[bytes] = []
+        self._stopping = False
 
     def run_script(self, script_path: str, script_dir: str, python_exec: str, script_name: str):
-        if self.worker_thread and self.worker_thread.isRunning():
+        if self.process is not None:
             self.output_signal.emit("⚠️ Скрипт уже запущен, остановите его перед запуском нового.")
             return
 
         self.output_signal.emit(f"▶ Запускаю скрипт: {script_name}")
-        self.worker_thread = WorkerThread(script_path, cwd=script_dir, python_exec=python_exec)
-        self.worker_thread.output_signal.connect(self.output_signal.emit)
-        self.worker_thread.error_signal.connect(self.error_signal.emit)
-        self.worker_thread.finished_signal.connect(lambda: self._on_script_finished(script_name))
-        self.worker_thread.start()
+        self._script_name = script_name
+        script_path = os.path.abspath(script_path)
+        if not os.path.exists(script_path):
+            self.script_started_signal.emit(script_name)
+            self.error_signal.emit(f"Ошибка: файл скрипта не найден: {script_path}")
+            self._on_script_finished()
+            return
+
+        # Декодер корректно склеивает многобайтовые символы UTF-8, разрезанные между порциями вывода
+        self._stdout_decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        self._stdout_pending = []
+        self._stderr_chunks = []
+        self._stopping = False
+
+        self.process = QProcess(self)
+        if script_dir:
+            self.process.setWorkingDirectory(os.path.abspath(script_dir))
+        self.process.readyReadStandardOutput.connect(self._read_stdout)
+        # stderr вычитывается по мере поступления (скрипт не зависнет на заполненном канале),
+        # но отдается одним сообщением после завершения, как и раньше
+        self.process.readyReadStandardError.connect(self._read_stderr)
+        self.process.finished.connect(self._on_process_finished)
+        self.process.errorOccurred.connect(self._on_process_error)
+        # FailedToStart может прийти синхронно внутри start() - "запущен" должен быть отправлен раньше "завершен"
         self.script_started_signal.emit(script_name)
+        self.process.start(python_exec, [script_path])
 
     def stop_script(self):
-        if self.worker_thread and self.worker_thread.isRunning():
+        if self.process is not None:
             self.output_signal.emit("⏹ Останавливаю скрипт...")
-            self.worker_thread.stop()
+            self._stopping = True
+            self.process.terminate()
+            if not self.process.waitForFinished(100):
+                self.process.kill()
+                self.process.waitForFinished()
         else:
             self.output_signal.emit("ℹ️ Нет запущенных скриптов для остановки.")
 
-    def _on_script_finished(self, script_name: str):
+    def _read_stdout(self):
+        if self.process is None:
+            return
+        text = self._stdout_decoder.decode(bytes(self.process.readAllStandardOutput()))
+        self._stdout_pending.append(text)
+        # Скрипт может долго печатать без перевода строки (прогресс через \r): без '\n' куски только
+        # накапливаются, иначе каждая порция копировала бы всю растущую строку заново
+        if '\n' not in text:
+            return
+        *lines, tail = ''.join(self._stdout_pending).split('\n')
+        self._stdout_pending = [tail] if tail else []
+        # Строки одной порции уходят пачками по OUTPUT_BATCH_LINES, а не по одному сигналу на строку
+        for start in range(0, len(lines), self.OUTPUT_BATCH_LINES):
+            batch = lines[start:start + self.OUTPUT_BATCH_LINES]
+            self.output_signal.emit("\n".join(line.strip() for line in batch))
+
+    def _read_stderr(self):
+        if self.process is not None:
+            self._stderr_chunks.append(bytes(self.process.readAllStandardError()))
+
+    def _on_process_finished(self, exit_code: int, exit_status):
+        self._read_stdout()
+        self._read_stderr()
+        if not self._stopping:
+            self._stdout_pending.append(self._stdout_decoder.decode(b'', final=True))
+            tail = ''.join(self._stdout_pending)
+            if tail:
+                self.output_signal.emit(tail.strip())
+            stderr = b''.join(self._stderr_chunks).decode('utf-8', errors='replace')
+            if stderr.strip():
+                self.error_signal.emit(stderr.strip())
+        self._on_script_finished()
+
+    def _on_process_error(self, error):
+        # При FailedToStart сигнал finished не приходит - завершаем запуск здесь
+        if error == QProcess.FailedToStart and self.process is not None:
+            self.error_signal.emit(f"❌ Критическая ошибка выполнения: {self.process.errorString()}")
+            self._on_script_finished()
+
+    def _on_script_finished(self):
+        script_name = self._script_name
+        if self.process is not None:
+            self.process.deleteLater()
+        self.process = None
+        self._script_name = None
+        self._stderr_chunks = []
         self.output_signal.emit("✅ Выполнение скрипта завершено.")
         self.script_finished_signal.emit(script_name)
-        self.worker_thread = None
 
 
-class WorkerThread(QThread):
-    output_signal = pyqtSignal(str)
+class LogWriterThread(QThread):
+    """Пишет файлы логов в отдельном потоке: медленный диск не останавливает GUI."""
     error_signal = pyqtSignal(str)
-    finished_signal = pyqtSignal()
 
-    def __init__(self, script_path: str, cwd: Optional[str] = None, python_exec: str = sys.executable):
-        super().__init__()
-        self.script_path = os.path.abspath(script_path)
-        self.cwd = os.path.abspath(cwd) if cwd else None
-        self.python_exec = python_exec
-        self.process = None
-        self._is_running = True
+    _WRITE, _CLOSE, _STOP = range(3)
 
-    def run(self):
-        try:
-            if not os.path.exists(self.script_path):
-                self.error_signal.emit(f"Ошибка: файл скрипта не найден: {self.script_path}")
-                return
+    def __init__(self):
+        super().__init__()
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._files: Dict[str, io.BufferedWriter] = {}  # путь -> открытый файл (только в этом потоке)
 
-            self.process = subprocess.Popen(
-                [self.python_exec, self.script_path],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True,
-                encoding='utf-8',
-                cwd=self.cwd
-            )
+    def write(self, path: str, data: bytes):
+        self._queue.put((self._WRITE, path, data))
 
-            while self._is_running and self.process.poll() is None:
-                output = self.process.stdout.readline()
-                if output:
-                    self.output_signal.emit(output.strip())
+    def close_file(self, path: str, timeout: float = 5.0):
+        """Закрывает файл после всех ранее поставленных записей и ждет этого (перед удалением/переименованием папки)."""
+        if not self.isRunning():
+            return
+        done = threading.Event()
+        self._queue.put((self._CLOSE, path, done))
+        done.wait(timeout)
 
-            if not self._is_running:
-                return
+    def stop(self):
+        self._queue.put((self._STOP, None, None))
+        self.wait()
 
-            _, stderr = self.process.communicate()
-            if stderr:
-                self.error_signal.emit(stderr.strip())
+    def run(self):
+        while True:
+            command = self._queue.get()
+            # Все, что накопилось в очереди, пишется пачкой, затем файлы сбрасываются на диск один раз
+            dirty: Set[str] = set()
+            while True:
+                kind, path, payload = command
+                if kind == self._STOP:
+                    self._flush(dirty)
+                    for path in list(self._files):
+                        self._close(path)
+                    return
+                if kind == self._WRITE:
+                    if self._write(path, payload):
+                        dirty.add(path)
+                    else:
+                        dirty.discard(path)  # файл уже закрыт после ошибки
+                else:
+                    self._close(path)
+                    dirty.discard(path)
+                    payload.set()
+                try:
+                    command = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            self._flush(dirty)
 
+    def _write(self, path: str, data: bytes) -> bool:
+        try:
+            log_file = self._files.get(path)
+            if log_file is None:
+                log_file = self._files[path] = open(path, "ab", buffering=256 * 1024)
+            log_file.write(data)
+            return True
         except Exception as e:
-            self.error_signal.emit(f"❌ Критическая ошибка выполнения: {str(e)}")
-        finally:
-            self.finished_signal.emit()
+            self._close(path)
+            self.error_signal.emit(f"❌ Ошибка записи в файл логов: {e}")
+            return False
 
-    def stop(self):
-        self._is_running = False
-        if self.process:
-            self.process.terminate()
-            if self.process.poll() is None:
-                QThread.msleep(100)
-                if self.process.poll() is None:
-                    self.process.kill()
-            self.process.wait()
+    def _flush(self, paths: Set[str]):
+        for path in paths:
+            try:
+                self._files[path].flush()
+            except Exception as e:
+                self._close(path)
+                self.error_signal.emit(f"❌ Ошибка записи в файл логов: {e}")
+
+    def _close(self, path: str):
+        # Открытый файл не дает удалить или переименовать папку скрипта на Windows
+        log_file = self._files.pop(path, None)
+        if log_file is not None:
+            try:
+                log_file.close()
+            except OSError:
+                pass
+
+
+def _start_click_animation(button, checked: bool = False):
+    effect = QGraphicsOpacityEffect(button)
+    button.setGraphicsEffect(effect)
+    animation = QPropertyAnimation(effect, b"opacity")
+    animation.setDuration(250)
+    animation.setStartValue(0.5)
+    animation.setEndValue(1.0)
+    animation.setEasingCurve(QEasingCurve.InOutQuad)
+    animation.start(QPropertyAnimation.DeleteWhenStopped)
+    button.animation = animation
 
 
 class StylesheetHelper:
     @staticmethod
     def add_shadow(widget):
+        # QGraphicsDropShadowEffect рендерит виджет во внеэкранный буфер и размывает его программно
+        # при каждой перерисовке - поэтому тень только у редко перерисовываемых виджетов (кнопок)
         shadow = QGraphicsDropShadowEffect()
         shadow.setBlurRadius(20)
         shadow.setXOffset(0)
@@ -834,24 +1356,16 @@ class StylesheetHelper:
 
     @staticmethod
     def animate_button_click(button):
-        def start_animation():
-            effect = QGraphicsOpacityEffect(button)
-            button.setGraphicsEffect(effect)
-            animation = QPropertyAnimation(effect, b"opacity")
-            animation.setDuration(250)
-            animation.setStartValue(0.5)
-            animation.setEndValue(1.0)
-            animation.setEasingCurve(QEasingCurve.InOutQuad)
-            animation.start(QPropertyAnimation.DeleteWhenStopped)
-            button.animation = animation
-
-        try:
-            button.clicked.disconnect(button.animation_slot)
+        # Обычно слота еще нет: проверка атрибута дешевле, чем исключение на каждой новой кнопке
+        slot = getattr(button, 'animation_slot', None)
+        if slot is not None:
+            try:
+                button.clicked.disconnect(slot)
+            except TypeError:
+                pass
             del button.animation_slot
-        except (AttributeError, TypeError):
-            pass
 
-        button.animation_slot = start_animation
+        button.animation_slot = functools.partial(_start_click_animation, button)
         button.clicked.connect(button.animation_slot)
 
 
@@ -868,10 +1382,26 @@ class ScriptManager(QWidget):
     log_output_signal = pyqtSignal(str)  # Для внутренних логов ScriptManager, если есть
     scripts_loaded_signal = pyqtSignal()  # Добавьте этот сигнал
 
+    # Оформление закрепленных скриптов: общие объекты для всех элементов списка
+    PIN_BACKGROUND = QColor(40, 40, 60)
+    PIN_FOREGROUND = QColor(200, 200, 255)
+    _pin_icon: Optional[QIcon] = None  # QIcon.fromTheme ищет иконку в теме - создается один раз, после QApplication
+    ORDER_SAVE_DELAY_MS = 250
+
     def __init__(self):
         super().__init__()
         self.script_operations = ScriptOperations()
         self.script_list_manager = ScriptListManager()
+        self._name_to_row: Dict[str, int] = {}  # имя скрипта -> строка в script_list
+
+        # Одно перетаскивание может дать несколько rowsMoved подряд: порядок пишется на диск
+        # один раз, через ORDER_SAVE_DELAY_MS после последнего перемещения
+        self._order_save_timer = QTimer(self)
+        self._order_save_timer.setSingleShot(True)
+        self._order_save_timer.setInterval(self.ORDER_SAVE_DELAY_MS)
+        self._order_save_timer.timeout.connect(self._flush_order_now)
+        QApplication.instance().aboutToQuit.connect(self._flush_pending_order)
+
         self._init_ui()
         self.load_scripts_to_ui()
 
@@ -921,7 +1451,6 @@ class ScriptManager(QWidget):
         layout.addWidget(self.stop_button)
         self.setLayout(layout)
 
-        StylesheetHelper.add_shadow(self.script_list)
         StylesheetHelper.add_shadow(self.run_button)
         StylesheetHelper.add_shadow(self.stop_button)
         StylesheetHelper.add_shadow(add_script_btn)
@@ -981,36 +1510,58 @@ class ScriptManager(QWidget):
     def _on_script_renamed_internal(self, old_name: str, new_name: str):
         if old_name in self.script_list_manager.pinned_scripts:
             self.script_list_manager.pinned_scripts.remove(old_name)
-            self.script_list_manager.pinned_scripts.add(new_name)
+            self.script_list_manager.pinned_scripts.add(sys.intern(new_name))
             self.script_list_manager.save_pinned_scripts()
         self.load_scripts_to_ui()
         self.script_selected_signal.emit(new_name)
 
-    def load_scripts_to_ui(self):
-        self.script_list.clear()
+    @classmethod
+    def _get_pin_icon(cls) -> QIcon:
+        if cls._pin_icon is None:
+            cls._pin_icon = QIcon.fromTheme("pin")
+        return cls._pin_icon
+
+    def _apply_pin_style(self, item: QListWidgetItem, pinned: bool):
+        if pinned:
+            item.setData(Qt.UserRole + 1, True)
+            item.setIcon(self._get_pin_icon())
+            item.setBackground(self.PIN_BACKGROUND)
+            item.setForeground(self.PIN_FOREGROUND)
+            item.setFlags(item.flags() | Qt.ItemIsUserCheckable)
+        else:
+            item.setData(Qt.UserRole + 1, None)
+            item.setIcon(QIcon())
+            item.setBackground(QBrush())
+            item.setForeground(QBrush())
+            item.setFlags(item.flags() & ~Qt.ItemIsUserCheckable)
+
+    def load_scripts_to_ui(self, select: Optional[str] = None):
+        self._flush_pending_order()  # get_all_scripts должен видеть последний порядок
         all_scripts = self.script_list_manager.get_all_scripts()
-        for script_name in all_scripts:
-            item = QListWidgetItem(script_name)
-            if script_name in self.script_list_manager.pinned_scripts:
-                item.setData(Qt.UserRole + 1, True)
-                item.setIcon(QIcon.fromTheme("pin"))
-                item.setBackground(QColor(40, 40, 60))
-                item.setForeground(QColor(200, 200, 255))
-                item.setFlags(item.flags() | Qt.ItemIsUserCheckable)
-            self.script_list.addItem(item)
+        pinned = self.script_list_manager.pinned_scripts
+        # После обновления выбирается select, иначе ранее выбранный скрипт, иначе первый
+        target = select or self.get_selected_script_name()
+        # Перерисовка отключается на время заполнения: один repaint вместо одного на каждый элемент.
+        # Сигналы тоже: clear() и addItem() не должны выглядеть как смена выбранного скрипта
+        self.script_list.setUpdatesEnabled(False)
+        signals_blocked = self.script_list.blockSignals(True)
+        try:
+            self.script_list.clear()
+            for script_name in all_scripts:
+                item = QListWidgetItem(script_name)
+                if script_name in pinned:
+                    self._apply_pin_style(item, True)
+                self.script_list.addItem(item)
+        finally:
+            self.script_list.blockSignals(signals_blocked)
+            self.script_list.setUpdatesEnabled(True)
+        self._name_to_row = {name: row for row, name in enumerate(all_scripts)}
         if self.script_list.count() > 0:
-            # После обновления списка, если был выбран скрипт, выбираем его снова
-            # Иначе, выбираем первый
-            current_selected = self.get_selected_script_name()
-            if current_selected and current_selected in all_scripts:
-                # Найти и выбрать элемент с тем же именем
-                items = self.script_list.findItems(current_selected, Qt.MatchExactly)
-                if items:
-                    self.script_list.setCurrentItem(items[0])
-            elif self.script_list.count() > 0:
-                self.script_list.setCurrentRow(0)
-            else:  # Если скриптов нет
-                self.script_selected_signal.emit("")
+            # Выбор делается уже с включенными сигналами: повторный выбор того же скрипта
+            # MainWindow отбрасывает сам
+            self.script_list.setCurrentRow(self._name_to_row.get(target, 0))
+        else:  # Если скриптов нет
+            self.script_selected_signal.emit("")
         self.scripts_loaded_signal.emit()  # Вызываем после загрузки
 
     def get_selected_script_name(self) -> Optional[str]:
@@ -1022,7 +1573,78 @@ class ScriptManager(QWidget):
         if script_name:
             self.script_selected_signal.emit(script_name)
 
+    def remove_script_item(self, script_name: str):
+        """Убирает один скрипт из списка без пересборки."""
+        row = self._name_to_row.pop(script_name, None)
+        if row is None:
+            self.load_scripts_to_ui()
+            return
+        # Если удаляется выбранный скрипт, виджет сам выберет соседний и отправит сигнал выбора
+        self.script_list.takeItem(row)
+        for index in range(row, self.script_list.count()):
+            self._name_to_row[self.script_list.item(index).text()] = index
+        if self.script_list.count() == 0:
+            self.script_selected_signal.emit("")
+
+    def rename_script_item(self, old_name: str, new_name: str):
+        """Переименовывает элемент списка на месте и ставит его на новую позицию."""
+        row = self._name_to_row.pop(old_name, None)
+        if row is None:
+            self.load_scripts_to_ui()
+            return
+        signals_blocked = self.script_list.blockSignals(True)
+        try:
+            self.script_list.item(row).setText(new_name)
+        finally:
+            self.script_list.blockSignals(signals_blocked)
+        self._name_to_row[new_name] = row
+        self.update_pin_state(new_name)  # оформление и позиция по новому имени
+
+    def update_pin_state(self, script_name: str):
+        """Обновляет оформление и позицию одного скрипта после (от)закрепления без пересборки списка."""
+        self._flush_pending_order()
+        all_scripts = self.script_list_manager.get_all_scripts()
+        old_row = self._name_to_row.get(script_name)
+        if old_row is None or len(all_scripts) != self.script_list.count() or script_name not in all_scripts:
+            self.load_scripts_to_ui()
+            return
+
+        item = self.script_list.item(old_row)
+        self._apply_pin_style(item, script_name in self.script_list_manager.pinned_scripts)
+
+        new_row = all_scripts.index(script_name)
+        if new_row != old_row:
+            was_current = self.script_list.currentItem() is item
+            # Перестановка не должна выглядеть для остальных как смена выбранного скрипта
+            signals_blocked = self.script_list.blockSignals(True)
+            try:
+                self.script_list.takeItem(old_row)
+                self.script_list.insertItem(new_row, item)
+                if was_current:
+                    self.script_list.setCurrentItem(item)
+            finally:
+                self.script_list.blockSignals(signals_blocked)
+            for row in range(min(old_row, new_row), max(old_row, new_row) + 1):
+                self._name_to_row[self.script_list.item(row).text()] = row
+
+        # Если остальной порядок в виджете разошелся с get_all_scripts (например, после перетаскивания
+        # незакрепленных скриптов), перемещения одного элемента недостаточно
+        if any(self.script_list.item(row).text() != name for row, name in enumerate(all_scripts)):
+            self.load_scripts_to_ui()
+
     def _on_scripts_reordered(self, parent, start, end, destination, row):
+        lo = min(start, row)
+        hi = max(end, row)
+        for index in range(lo, min(hi + 1, self.script_list.count())):
+            self._name_to_row[self.script_list.item(index).text()] = index
+        self._order_save_timer.start()  # перезапуск откладывает запись до конца серии перемещений
+
+    def _flush_pending_order(self):
+        if self._order_save_timer.isActive():
+            self._order_save_timer.stop()
+            self._flush_order_now()
+
+    def _flush_order_now(self):
         current_order = [self.script_list.item(i).text() for i in range(self.script_list.count())]
         self.script_list_manager.save_scripts_order(current_order)
 
@@ -1061,7 +1683,7 @@ class ScriptManager(QWidget):
 
     def _toggle_pin_script_ui(self, script_name: str):
         self.script_list_manager.toggle_pin_script(script_name)
-        self.load_scripts_to_ui()
+        self.update_pin_state(script_name)
 
     def _request_rename_script(self, script_name: str):
         new_name, ok = QInputDialog.getText(self, "Переименовать скрипт", "Введите новое имя для скрипта:",
@@ -1076,10 +1698,21 @@ class SettingsPanel(QWidget):
     log_output_signal = pyqtSignal(str)
     request_copy_settings_file_signal = pyqtSignal(str, str)  # source_path, dest_path
 
+    SETTINGS_SAVE_DELAY_MS = 200
+
     def __init__(self):
         super().__init__()
         self.settings_manager = SettingsManager()  # Теперь SettingsManager сам отправляет логи
         self.fields: Dict[str, QLineEdit] = {}
+        # (ключ, field.text) - собираются при построении формы, чтобы сохранение не обходило self.fields
+        self._field_getters: List[Tuple[str, Callable[[], str]]] = []
+
+        # Переход между полями вызывает editingFinished у каждого: пишем файл один раз после серии правок
+        self._settings_save_timer = QTimer(self)
+        self._settings_save_timer.setSingleShot(True)
+        self._settings_save_timer.setInterval(self.SETTINGS_SAVE_DELAY_MS)
+        self._settings_save_timer.timeout.connect(self._save_settings_now)
+        QApplication.instance().aboutToQuit.connect(self._flush_pending_settings)
         self.current_script_name: Optional[str] = None
         self.current_settings_path: Optional[str] = None
         self.load_btn = None
@@ -1092,7 +1725,6 @@ class SettingsPanel(QWidget):
         self.setAcceptDrops(True)
         self.form = QFormLayout()
         self.setLayout(self.form)
-        StylesheetHelper.add_shadow(self)
 
     def dragEnterEvent(self, event):
         if (event.mimeData().hasUrls() and self.current_script_name and
@@ -1126,7 +1758,9 @@ class SettingsPanel(QWidget):
         else:
             event.ignore()
 
-    def load_settings_for_script(self, script_name: str):
+    def load_settings_for_script(self, script_name: str, has_settings: Optional[bool] = None):
+        """has_settings - известное заранее наличие settings.json; None - проверить на диске."""
+        self._flush_pending_settings()  # отложенные правки относятся к предыдущему скрипту
         self._clear_form()
         self.current_script_name = script_name
         if not script_name:
@@ -1135,7 +1769,9 @@ class SettingsPanel(QWidget):
 
         self.current_settings_path = self.settings_manager.get_settings_path(script_name)
 
-        if not os.path.exists(self.current_settings_path):
+        if has_settings is None:
+            has_settings = os.path.exists(self.current_settings_path)
+        if not has_settings:
             self._show_no_settings_warning()
         else:
             self._load_json_into_form()
@@ -1146,6 +1782,7 @@ class SettingsPanel(QWidget):
             if item.widget():
                 item.widget().deleteLater()
         self.fields = {}
+        self._field_getters = []
 
     def _show_no_settings_warning(self):
         warning = QLabel("⚠️ У этого скрипта ещё нет файла настроек.\n\nПеретащите .json файл сюда или нажмите кнопку.")
@@ -1173,6 +1810,9 @@ class SettingsPanel(QWidget):
             self.request_copy_settings_file_signal.emit(path, self.current_settings_path)
 
     def _load_json_into_form(self):
+        # Форма перечитывается с диска (например, после копирования файла): несохраненные правки
+        # старой формы не должны перезаписать новый файл
+        self._settings_save_timer.stop()
         self._clear_form()
         data = self.settings_manager.load_settings(self.current_settings_path)
         if data:
@@ -1180,26 +1820,84 @@ class SettingsPanel(QWidget):
                 field = QLineEdit(str(value))
                 field.editingFinished.connect(self._save_settings)
                 self.fields[key] = field
+                self._field_getters.append((key, field.text))
                 self.form.addRow(key, field)
 
     def _save_settings(self):
         if not self.current_script_name:
             return
+        self._settings_save_timer.start()  # перезапуск откладывает запись до конца серии правок
+
+    def _flush_pending_settings(self):
+        if not self._settings_save_timer.isActive():
+            return
+        self._settings_save_timer.stop()
+        # Папку скрипта могли удалить или переименовать - не создаем ее заново ради старых правок
+        if self.current_settings_path and os.path.isdir(os.path.dirname(self.current_settings_path)):
+            self._save_settings_now()
 
-        data = {key: field.text() for key, field in self.fields.items()}
+    def _save_settings_now(self):
+        if not self.current_script_name:
+            return
+
+        data = {key: getter() for key, getter in self._field_getters}
         self.settings_manager.save_settings(self.current_settings_path, data)
 
 
 class MainWindow(QMainWindow):
     """Main application window for Script Hub."""
 
+    LOG_FLUSH_INTERVAL_MS = 50
+    DEPS_CHECK_DELAY_MS = 150
+
     def __init__(self):
         super().__init__()
-        self._script_logs: Dict[str, str] = {}  # Словарь для хранения только сессионных логов по скриптам
+        # Сессионные логи по скриптам: кольцевой буфер строк, не больше, чем вмещает консоль
+        self._script_logs: Dict[str, Deque[str]] = {}
+        # Сколько строк всего добавлено в лог скрипта за сессию (не уменьшается при вытеснении из deque)
+        self._log_line_totals: Dict[str, int] = {}
+        # Чей лог сейчас в консоли и сколько его строк (по счетчику _log_line_totals) уже выведено:
+        # при обновлениях консоль дописывает только хвост, а не перестраивается целиком
+        self._displayed_script: Optional[str] = None
+        self._displayed_total = 0
+
+        # Строки логов копятся в буферах и раз в LOG_FLUSH_INTERVAL_MS уходят одной записью в файл
+        # и одним добавлением в консоль - вместо открытия файла и перерисовки на каждую строку
+        self._pending_logs: Dict[str, List[str]] = {}  # имя скрипта -> строки для script_log.txt
+        self._pending_console_lines: List[str] = []
+        self._pending_cropped: Set[str] = set()  # скрипты, в пачке которых есть обрезанные для консоли строки
+        # Запись script_log.txt идет в отдельном потоке; открытые файлы живут там же
+        self._log_writer = LogWriterThread()
+        self._log_writer.error_signal.connect(self._on_log_write_error)
+        self._log_writer.start()
+        # имя скрипта -> (папка скрипта, script.py, script_log.txt); сбрасывается при удалении/переименовании
+        self._script_paths: Dict[str, Tuple[str, str, str]] = {}
+        self._log_flush_timer = QTimer(self)
+        self._log_flush_timer.setSingleShot(True)
+        self._log_flush_timer.setInterval(self.LOG_FLUSH_INTERVAL_MS)
+        self._log_flush_timer.timeout.connect(self._flush_logs)
+
+        # Один таймер скрытия прогресс-бара на все обновления: повторный start() сдвигает срок
+        self._progress_hide_timer = QTimer(self)
+        self._progress_hide_timer.setSingleShot(True)
+        self._progress_hide_timer.setInterval(1000)
+        self._progress_hide_timer.timeout.connect(self._hide_progress_bar)
+
+        # Проверка зависимостей откладывается: при быстром переборе списка (стрелками) проверяется
+        # только скрипт, на котором выбор остановился
+        self._deps_check_timer = QTimer(self)
+        self._deps_check_timer.setSingleShot(True)
+        self._deps_check_timer.setInterval(self.DEPS_CHECK_DELAY_MS)
+        self._deps_check_timer.timeout.connect(self._do_deps_check)
         # Удаляем _loaded_script_logs, так как мы никогда не будем автоматически подгружать логи из файла.
         # self._loaded_script_logs: Set[str] = set()
         self.current_script_name: Optional[str] = None  # Текущий активный скрипт
+        # Пути текущего скрипта, вычисляются один раз при выборе
+        self._current_script_dir: Optional[str] = None
+        self._current_script_path: Optional[str] = None
         self.running_script_name: Optional[str] = None  # Имя скрипта, который сейчас выполняется
+        # Папку запущенного скрипта удалили - его вывод до завершения процесса отбрасывается
+        self._discard_script_output = False
 
         # Инициализация всех менеджеров
         self.script_operations = ScriptOperations()
@@ -1246,14 +1944,18 @@ class MainWindow(QMainWindow):
             set_dark_title_bar(self)
 
     def _init_ui(self):
-        self.output_console = QTextEdit()
+        # QPlainTextEdit - плоская раскладка блоков без rich text: добавление строки не пересчитывает документ
+        self.output_console = QPlainTextEdit()
         self.output_console.setReadOnly(True)
-        StylesheetHelper.add_shadow(self.output_console)
+        self.output_console.setMaximumBlockCount(MAXIMUM_BLOCK_COUNT)
+        # Консоль только для чтения: история отмены каждого добавления не нужна
+        self.output_console.setUndoRedoEnabled(False)
+        self.output_console.setCenterOnScroll(False)
+        self.output_console.setTextInteractionFlags(Qt.TextSelectableByMouse | Qt.TextSelectableByKeyboard)
 
         self.progress_bar = QProgressBar()
         self.progress_bar.setRange(0, 100)
         self.progress_bar.setVisible(False)
-        StylesheetHelper.add_shadow(self.progress_bar)
 
         left_widget = self._create_left_widget()
         right_widget = self._create_right_widget()
@@ -1285,8 +1987,8 @@ class MainWindow(QMainWindow):
         # --- Connections from ScriptExecutor ---
         self.script_executor.script_started_signal.connect(self._on_script_execution_started)
         self.script_executor.script_finished_signal.connect(self._on_script_execution_finished)
-        self.script_executor.output_signal.connect(self.log_output)
-        self.script_executor.error_signal.connect(self.log_output)
+        self.script_executor.output_signal.connect(self._log_script_output)
+        self.script_executor.error_signal.connect(self._log_script_output)
 
         # --- Connections from DependencyManagement ---
         self.dependency_manager.log_output_signal.connect(self.log_output)
@@ -1373,29 +2075,148 @@ class MainWindow(QMainWindow):
             else:
                 self.log_output("Запуск скрипта отменен пользователем.")
 
+    @pyqtSlot(str)
     def log_output(self, text: str):
         """Appends text to the output console and saves it to the current script's log file."""
-        if self.current_script_name:
-            # Добавляем текст к логам текущего скрипта в памяти (сессионные логи)
-            if self.current_script_name not in self._script_logs:
-                self._script_logs[self.current_script_name] = ""
-            self._script_logs[self.current_script_name] += text + "\n"
-
-            # Записываем в файл логов (основные логи)
-            log_file_path = os.path.join(self.script_operations.get_script_dir(self.current_script_name),
-                                         "script_log.txt")
-            try:
-                with open(log_file_path, "a", encoding="utf-8") as f:
-                    f.write(text + "\n")
-            except Exception as e:
-                # Если не удается записать в файл логов, хотя бы вывести ошибку
-                self.output_console.append(f"❌ Ошибка записи в файл логов: {e}")
+        self._append_log(self.current_script_name, text)
+
+    @pyqtSlot(str)
+    def _log_script_output(self, text: str):
+        if self._discard_script_output:
+            return  # писать некуда, а чужому скрипту этот вывод не принадлежит
+        # Вывод запущенного скрипта относится к нему, даже если пользователь уже выбрал другой скрипт
+        self._append_log(self.running_script_name or self.current_script_name, text)
 
-            # Обновляем QtextEdit, если это текущий активный скрипт
-            self.output_console.append(text)
+    def _append_log(self, script_name: Optional[str], text: str):
+        if script_name:
+            # Добавляем текст к логам скрипта в памяти (сессионные логи). Текст может
+            # содержать несколько строк - храним построчно, как их считает консоль
+            script_log = self._script_logs.get(script_name)
+            if script_log is None:
+                script_log = self._script_logs[script_name] = deque(maxlen=MAXIMUM_BLOCK_COUNT)
+            lines, cropped = _crop_log_lines(text)
+            script_log.extend(lines)
+            self._log_line_totals[script_name] = self._log_line_totals.get(script_name, 0) + len(lines)
+            if cropped:
+                # Склеенная пачка для файла уже не совпадает с тем, что показывает консоль
+                self._pending_cropped.add(script_name)
+
+            # В файл логов (основные логи) строка попадет при ближайшем сбросе буферов. В консоль -
+            # только если этот скрипт сейчас отображается, вместе с остальным новым хвостом его лога
+            self._pending_logs.setdefault(script_name, []).append(text)
         else:
             # Если скрипт не выбран, просто выводим в консоль (для системных сообщений)
-            self.output_console.append(text)
+            self._pending_console_lines.append("\n".join(_crop_log_lines(text)[0]))
+        if not self._log_flush_timer.isActive():
+            self._log_flush_timer.start()
+
+    @pyqtSlot()
+    def _flush_logs(self):
+        self._log_flush_timer.stop()
+        pending_logs, self._pending_logs = self._pending_logs, {}
+        cropped, self._pending_cropped = self._pending_cropped, set()
+        console_lines, self._pending_console_lines = self._pending_console_lines, []
+
+        # Пачка строк склеивается один раз: та же строка идет в консоль, ее UTF-8 байты - в файл
+        displayed_text = None
+        for script_name, lines in pending_logs.items():
+            joined = "\n".join(lines)
+            if script_name == self._displayed_script and script_name not in cropped:
+                displayed_text = joined
+            self._log_writer.write(self._resolve_paths(script_name)[2], joined.encode("utf-8") + b"\n")
+
+        # Скрытая консоль не обновляется: строки остаются в памяти и дописываются при показе окна
+        if self.output_console.isVisible():
+            self._sync_console(displayed_text)
+        if console_lines:
+            self._append_to_console("\n".join(console_lines))
+
+    def _sync_console(self, new_text: Optional[str] = None):
+        """Дописывает в консоль строки отображаемого скрипта, появившиеся после прошлого вывода.
+
+        new_text - уже склеенные строки, добавленные с прошлого сброса; используется, если это весь хвост.
+        """
+        script_name = self._displayed_script
+        if not script_name:
+            return
+        total = self._log_line_totals.get(script_name, 0)
+        new_count = total - self._displayed_total
+        if new_count <= 0:
+            return
+        script_log = self._script_logs.get(script_name, ())
+        if new_count >= len(script_log):
+            # Новых строк не меньше, чем вмещает буфер: проще показать буфер целиком
+            self._show_full_log(script_name)
+            return
+        if new_text is None or new_text.count("\n") + 1 != new_count:
+            tail = list(itertools.islice(reversed(script_log), new_count))
+            tail.reverse()
+            new_text = "\n".join(tail)
+        self._append_to_console(new_text)
+        self._displayed_total = total
+
+    def _append_to_console(self, text: str):
+        # Вся пачка строк вставляется в одном блоке редактирования - одна раскладка и перерисовка
+        scroll_bar = self.output_console.verticalScrollBar()
+        at_bottom = scroll_bar.value() == scroll_bar.maximum()
+        document = self.output_console.document()
+        cursor = QTextCursor(document)
+        cursor.movePosition(QTextCursor.End)
+        cursor.beginEditBlock()
+        if not document.isEmpty():
+            cursor.insertBlock()
+        cursor.insertText(text)
+        cursor.endEditBlock()
+        if at_bottom:
+            # Как appendPlainText: консоль, прокрученная до конца, следует за новыми строками
+            scroll_bar.setValue(scroll_bar.maximum())
+
+    def _show_full_log(self, script_name: str):
+        # Без промежуточных перерисовок на время очистки и загрузки всего буфера
+        self.output_console.setUpdatesEnabled(False)
+        try:
+            self.output_console.clear()
+            script_log = self._script_logs.get(script_name)
+            if script_log:
+                # Вставка одним блоком редактирования - одна раскладка документа на весь текст
+                cursor = QTextCursor(self.output_console.document())
+                cursor.beginEditBlock()
+                cursor.insertText("\n".join(script_log))
+                cursor.endEditBlock()
+        finally:
+            self.output_console.setUpdatesEnabled(True)
+        self._displayed_script = script_name
+        self._displayed_total = self._log_line_totals.get(script_name, 0)
+
+    def _resolve_paths(self, script_name: str) -> Tuple[str, str, str]:
+        """Возвращает (папка скрипта, script.py, script_log.txt) без проверки существования файлов."""
+        paths = self._script_paths.get(script_name)
+        if paths is None:
+            script_dir = self.script_operations.get_script_dir(script_name)
+            paths = (script_dir, os.path.join(script_dir, "script.py"), os.path.join(script_dir, "script_log.txt"))
+            self._script_paths[script_name] = paths
+        return paths
+
+    def _close_log_file(self, script_name: str):
+        self._log_writer.close_file(self._resolve_paths(script_name)[2])
+
+    @pyqtSlot(str)
+    def _on_log_write_error(self, text: str):
+        # Если не удается записать в файл логов, хотя бы вывести ошибку
+        self.output_console.appendPlainText(text)
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self._sync_console()
+
+    def closeEvent(self, event):
+        # Отложенные записи настроек и порядка пишут в лог - они должны успеть до остановки записи логов.
+        # Обработчики aboutToQuit после этого ничего не делают: их таймеры уже остановлены
+        self.settings_panel._flush_pending_settings()
+        self.script_manager_ui._flush_pending_order()
+        self._flush_logs()
+        self._log_writer.stop()  # дописывает очередь и закрывает файлы
+        super().closeEvent(event)
 
     def _clear_current_script_logs(self):
         """Очищает только отображаемую консоль для текущего выбранного скрипта,
@@ -1412,21 +2233,30 @@ class MainWindow(QMainWindow):
         # )
 
         # if confirm == QMessageBox.Yes:
-        # 1. Очищаем QTextEdit (сессионные логи в консоли)
+        # 1. Очищаем консоль (сессионные логи); накопленные строки сначала дописываются в файл
+        self._flush_logs()
         self.output_console.clear()
 
         # 2. Очищаем кэш логов в памяти для текущего скрипта.
+        self._log_line_totals.pop(self.current_script_name, None)
+        self._displayed_script = self.current_script_name
+        self._displayed_total = 0
         if self.current_script_name in self._script_logs:
             del self._script_logs[self.current_script_name]
 
             # self.log_output(f"✅ Отображаемые (сессионные) логи для '{self.current_script_name}' очищены.")
             # Файл логов (script_log.txt) остается нетронутым.
 
+    @pyqtSlot(int)
     def _update_progress_bar(self, value: int):
         self.progress_bar.setValue(value)
         self.progress_bar.setVisible(value > 0 and value < 100)
         if value == 100:
-            QTimer.singleShot(1000, lambda: self.progress_bar.setVisible(False))
+            self._progress_hide_timer.start()
+
+    @pyqtSlot()
+    def _hide_progress_bar(self):
+        self.progress_bar.setVisible(False)
 
     def _display_script_logs(self, script_name: str):
         """
@@ -1434,39 +2264,61 @@ class MainWindow(QMainWindow):
         Если сессионных логов нет (при первом выборе скрипта или после очистки),
         консоль будет пустой.
         """
-        self.output_console.clear()
+        # Буферы сбрасываются до смены содержимого: накопленные строки уходят в файл и в консоль
+        self._flush_logs()
+        if script_name and script_name == self._displayed_script:
+            return  # консоль уже показывает этот лог, новый хвост дописан при сбросе
+
         if not script_name:
+            self.output_console.clear()
+            self._displayed_script = None
             return
 
-        # Если логи уже в кэше (сессионные), отображаем их
-        if script_name in self._script_logs:
-            self.output_console.setText(self._script_logs[script_name])
-        else:
-            # Если логов нет в кэше, значит, это первый выбор в текущей сессии
-            # или они были очищены. Мы не загружаем их из файла.
-            # Консоль остается пустой, как и запрашивалось.
-            pass
+        # Если логов нет в кэше, значит, это первый выбор в текущей сессии
+        # или они были очищены. Мы не загружаем их из файла - консоль остается пустой.
+        self._show_full_log(script_name)
 
     # --- Handlers for ScriptManager UI signals ---
 
+    @pyqtSlot(str)
     def _on_script_selection_changed_in_ui(self, script_name: str):
         """Обрабатывает смену выбранного скрипта в UI списка."""
-        self.current_script_name = script_name
-        self.settings_panel.load_settings_for_script(script_name)
+        if script_name and script_name == self.current_script_name:
+            return  # повторный выбор того же скрипта (или пересборка списка): настройки, логи и зависимости те же
+        self._set_current_script(script_name)
+        # Наличие settings.json известно из сканирования списка скриптов - без обращения к диску
+        self.settings_panel.load_settings_for_script(
+            script_name, self.script_manager_ui.script_list_manager.has_settings_file(script_name))
         self._display_script_logs(script_name)
 
         if script_name:
-            # После смены скрипта, проверяем зависимости
-            script_dir = self.script_operations.get_script_dir(script_name)
-            self.dependency_manager.check_dependencies(
-                script_dir)  # Это вызовет логирование через dependency_manager.log_output_signal
+            # После смены скрипта проверяем зависимости - когда выбор перестанет меняться
+            self._deps_check_timer.start()
+        else:
+            self._deps_check_timer.stop()
 
+    def _set_current_script(self, script_name: Optional[str]):
+        self.current_script_name = script_name
+        if script_name:
+            self._current_script_dir, self._current_script_path = self._resolve_paths(script_name)[:2]
+        else:
+            self._current_script_dir = self._current_script_path = None
+
+    @pyqtSlot()
+    def _do_deps_check(self):
+        if not self.current_script_name:
+            return
+        self.dependency_manager.check_dependencies(
+            self._current_script_dir)  # Это вызовет логирование через dependency_manager.log_output_signal
+
+    @pyqtSlot(str)
     def _add_script_handler(self, source_path: str):
         script_name = self.script_operations.add_script_file(source_path)
         if script_name:
             script_path = self.script_operations.get_script_path(script_name)
             script_dir = self.script_operations.get_script_dir(script_name)
 
+            self.dependency_manager.invalidate_dependency_check(script_dir)
             imports = self.dependency_manager.analyze_imports(script_path)
             if imports:
                 self.dependency_manager.create_requirements_file(script_dir, imports)
@@ -1483,65 +2335,108 @@ class MainWindow(QMainWindow):
                 self.log_output(f"ℹ️ Скрипт '{script_name}' не имеет внешних зависимостей.")
 
             # Обновляем UI списка скриптов и выбираем новый скрипт
-            self.script_manager_ui.load_scripts_to_ui()
+            self.script_manager_ui.script_list_manager.invalidate_scripts_cache()
+            self.script_manager_ui.load_scripts_to_ui(select=script_name)
+            # Если выбор уже пришел сигналом из списка, повторный вызов ничего не делает
             self._on_script_selection_changed_in_ui(script_name)  # Это также обновит логи и настройки
 
+    @pyqtSlot(str)
     def _delete_script_handler(self, script_name: str):
         confirm = QMessageBox.question(self, "Удалить?",
                                        f"Вы уверены, что хотите удалить скрипт '{script_name}' и все его файлы (настройки, venv, логи)?")
         if confirm == QMessageBox.Yes:
+            if self.running_script_name == script_name:
+                self.script_executor.stop_script()  # процесс держит папку скрипта и продолжает писать в лог
+            self._close_log_file(script_name)
             self.script_operations.delete_script_folder(script_name)  # Это отправит script_deleted_signal
 
+    @pyqtSlot(str)
     def _on_script_deleted_by_operations(self, script_name: str):
         """Реакция на сигнал об удалении скрипта от ScriptOperations."""
         if script_name in self._script_logs:
             del self._script_logs[script_name]  # Удаляем логи из памяти
+        self._pending_logs.pop(script_name, None)  # Папки скрипта больше нет - писать некуда
+        self._log_line_totals.pop(script_name, None)
+        self._script_paths.pop(script_name, None)
+        if self._displayed_script == script_name:
+            self._displayed_script = None
+        if self.running_script_name == script_name:
+            # Скрипт не удалось остановить до удаления - его дальнейший вывод не записывается
+            self.running_script_name = None
+            self._discard_script_output = True
         # self._loaded_script_logs теперь не используется
-        self.script_manager_ui.load_scripts_to_ui()  # Обновляем список UI
+        self.script_manager_ui.script_list_manager.invalidate_scripts_cache()
+        self.script_manager_ui.remove_script_item(script_name)  # Обновляем список UI
         if self.current_script_name == script_name:
-            self.current_script_name = None  # Сбрасываем текущий скрипт
+            self._set_current_script(None)  # Сбрасываем текущий скрипт
+            self._flush_logs()
             self.output_console.clear()
             self.settings_panel.load_settings_for_script("")  # Очищаем панель настроек
 
+    @pyqtSlot(str, str)
     def _rename_script_handler(self, old_name: str, new_name: str):
+        # Накопленные строки дописываются в старую папку, и файл закрывается до переименования
+        self._flush_logs()
+        self._close_log_file(old_name)
         if self.script_operations.rename_script_folder(old_name, new_name):  # Это отправит script_renamed_signal
             pass  # Дальнейшая логика в _on_script_renamed_by_operations
 
+    @pyqtSlot(str, str)
     def _on_script_renamed_by_operations(self, old_name: str, new_name: str):
         """Реакция на сигнал о переименовании скрипта от ScriptOperations."""
         if old_name in self._script_logs:
             self._script_logs[new_name] = self._script_logs.pop(old_name)  # Перемещаем логи в кэше
+        if old_name in self._pending_logs:
+            self._pending_logs[new_name] = self._pending_logs.pop(old_name)  # Допишутся в файл в новой папке
+        if old_name in self._log_line_totals:
+            self._log_line_totals[new_name] = self._log_line_totals.pop(old_name)
+        self._script_paths.pop(old_name, None)
+        if self._displayed_script == old_name:
+            self._displayed_script = new_name
+        if self.running_script_name == old_name:
+            self.running_script_name = new_name  # дальнейший вывод - в лог в новой папке
         # self._loaded_script_logs теперь не используется
-        self.script_manager_ui.load_scripts_to_ui()  # Обновляем список UI
+        self.script_manager_ui.script_list_manager.invalidate_scripts_cache()
+        self.script_manager_ui.rename_script_item(old_name, new_name)  # Обновляем список UI
         if self.current_script_name == old_name:
-            self.current_script_name = new_name
+            self._set_current_script(new_name)
             self.settings_panel.load_settings_for_script(new_name)  # Обновляем настройки и логи
 
+    @pyqtSlot(str)
     def _change_settings_file_handler(self, script_name: str):
         settings_path = self.settings_panel.settings_manager.get_settings_path(script_name)
         self.settings_panel._load_json_file_dialog()  # Это запустит диалог и отправит request_copy_settings_file_signal
 
+    @pyqtSlot(str, str)
     def _copy_settings_file_handler(self, source_path: str, destination_path: str):
         if self.settings_panel.settings_manager.copy_settings_file(source_path, destination_path):
+            self.script_manager_ui.script_list_manager.mark_settings_file(self.settings_panel.current_script_name)
             self.settings_panel._load_json_into_form()  # Обновляем форму настроек после копирования
 
     # --- Handlers for ScriptExecutor signals ---
+    @pyqtSlot(str)
     def _on_script_execution_started(self, script_name: str):
         self.running_script_name = script_name
+        self._discard_script_output = False
         self.script_manager_ui.set_run_stop_button_states(True)
 
+    @pyqtSlot(str)
     def _on_script_execution_finished(self, script_name: str):
         self.running_script_name = None
+        self._discard_script_output = False
         self.script_manager_ui.set_run_stop_button_states(False)
 
     # --- Handlers for DependencyManagement signals ---
+    @pyqtSlot(str, str)
     def _on_venv_created(self, script_dir: str, python_exec_path: str):
         self.log_output(f"✅ Виртуальное окружение готово для {os.path.basename(script_dir)}.")
         # После создания venv, запускаем установку зависимостей
         self.dependency_manager.install_dependencies(script_dir, python_exec_path)
 
     # А затем _on_dependencies_installed должен выглядеть так:
+    @pyqtSlot(str, bool)
     def _on_dependencies_installed(self, script_name: str, success: bool):
+        self.dependency_manager.invalidate_dependency_check(script_name)  # сигнал передает папку скрипта
         if success:
             self.log_output("✅ Установка зависимостей завершена успешно.")
             # После успешной установки, повторно вызываем _prepare_and_run_script
@@ -1556,7 +2451,6 @@ class MainWindow(QMainWindow):
 
         else:
             self.log_output(f"❌ Установка зависимостей для '{script_name}' завершилась с ошибками.")
-        self.dependency_manager.clear_packages_cache()
         self.progress_bar.setValue(0)  # Убедимся, что прогресс бар сбрасывается.
         self.progress_bar.setVisible(False)  # Скрыть прогресс бар
 
@@ -1570,19 +2464,17 @@ class MainWindow(QMainWindow):
 
         # Убедитесь, что мы работаем с текущим скриптом, если несколько Venv обрабатываются одновременно.
         # (Хотя ваша UI не позволяет запускать несколько скриптов одновременно)
-        current_script_dir = self.script_operations.get_script_dir(self.current_script_name)
-        if script_dir != current_script_dir:
+        if script_dir != self._current_script_dir:
             self.log_output(f"DEBUG: Venv готово для другого скрипта ({os.path.basename(script_dir)}), игнорирую.")
             return
 
-        script_name = self.current_script_name  # Используем текущий выбранный скрипт
-        script_path = self.script_operations.get_script_path(script_name)
-
-        self._check_and_install_dependencies_then_run(script_name, script_dir, python_exec_path)
+        self._check_and_install_dependencies_then_run(
+            self.current_script_name, script_dir, python_exec_path, self._current_script_path)
 
+    @pyqtSlot(str)
     def _prepare_and_run_script(self, script_name: str):
         script_path = self.script_operations.get_script_path(script_name)
-        script_dir = self.script_operations.get_script_dir(script_name)
+        script_dir = self._resolve_paths(script_name)[0]
 
         if not script_path:
             self.log_output(f"❌ Файл скрипта 'script.py' не найден в '{script_name}'.")
@@ -1604,16 +2496,27 @@ class MainWindow(QMainWindow):
             # _on_venv_ready_to_check_deps будет вызван, когда Venv будет готово.
             self.log_output("Ожидаю создания виртуального окружения для запуска скрипта...")
 
+    @pyqtSlot(bool, str)
     def _on_github_update_finished(self, success: bool, message: str):
         if success:
             self.log_output(f"🟢 Обновление скриптов с GitHub: {message}")
+            self.dependency_manager.invalidate_dependency_check()  # синхронизация могла заменить requirements.txt
+            # Синхронизация могла добавить script.py в существующие папки - mtime корня это не отражает
+            self.script_manager_ui.script_list_manager.invalidate_scripts_cache()
+            selected_script = self.current_script_name
             self.script_manager_ui.load_scripts_to_ui()  # Обновить UI после синхронизации скриптов
+            if selected_script and selected_script == self.current_script_name:
+                # Тот же скрипт выбран повторно, и _on_script_selection_changed_in_ui его пропускает,
+                # а синхронизация могла заменить его settings.json - перечитываем явно
+                self.settings_panel.load_settings_for_script(
+                    selected_script, self.script_manager_ui.script_list_manager.has_settings_file(selected_script))
             # Если вы хотите автоматически запускать venv/установку зависимостей для новых скриптов
             # это будет сложнее, так как нужно итерировать по новым скриптам.
             # Для начала, пусть пользователь запустит их вручную.
         else:
             self.log_output(f"🔴 Ошибка обновления скриптов с GitHub: {message}")
 
+    @pyqtSlot()
     def _check_for_updates(self):
         if self.settings_manager.get_setting("auto_update_scripts", True):
             self.github_manager.check_and_update_repository()
@@ -1624,6 +2527,11 @@ class MainWindow(QMainWindow):
 # Функции вне класса (если они не являются методами класса)
 def set_dark_title_bar(window):
     """Sets dark title bar for Windows 10/11."""
+    if sys.platform != "win32":
+        return
+    # ctypes импортируется только здесь: на старте приложения он больше нигде не нужен
+    import ctypes
+    from ctypes import wintypes
     try:
         hwnd = window.winId().__int__()
         DWMWA_USE_IMMERSIVE_DARK_MODE = 20
@@ -1650,8 +2558,7 @@ def set_dark_title_bar(window):
 if __name__ == "__main__":
     app = QApplication(sys.argv)
     try:
-        with open("styles.qss", "r", encoding="utf-8") as f:
-            app.setStyleSheet(f.read())
+        app.setStyleSheet(Path("styles.qss").read_text(encoding="utf-8", errors="replace"))
     except FileNotFoundError:
         print("styles.qss not found. Using default styles.")
     except Exception as e: